@@ -1,11 +1,15 @@
 # backend/main.py
+import asyncio
+import hashlib
 import json
-import requests
+from email.utils import formatdate, parsedate_to_datetime
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-import re
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
 # -------------------- OLLAMA CONFIG --------------------
 import os
@@ -24,86 +28,121 @@ if MODEL.endswith("-cloud"):
 else:
     OLLAMA_API = "http://localhost:11434/api/generate"
 
-def call_ollama(system_prompt: str, user_prompt: str, num_predict: int = 400, temp: float = 0.7, top_p: float = 0.9, repeat_penalty: float = 1.1) -> str:
-    payload = {
-        "model": MODEL,
-        "prompt": f"<|system|>\n{system_prompt}\n<|user|>\n{user_prompt}\n",
-        "options": {
-            "temperature": temp,
-            "top_p": top_p,
-            "repeat_penalty": repeat_penalty,
-            "num_predict": num_predict
-        },
-        "stream": False,
-    }
-    
-    # Add authentication headers for cloud models
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    # Only add auth for cloud models
-    if MODEL.endswith("-cloud") and OLLAMA_API_KEY:
-        headers["Authorization"] = f"Bearer {OLLAMA_API_KEY}"
-   
-    r = requests.post(OLLAMA_API, json=payload, headers=headers, timeout=240)
-    r.raise_for_status()
-    return r.json().get("response", "").strip()
+# Max number of agent generations one debate request may have in flight at once,
+# so a single debate with many custom agents cannot monopolize the Ollama server
+MAX_PARALLEL_GENERATIONS = max(1, int(os.getenv("MAX_PARALLEL_GENERATIONS", "3")))
+
+# Constrain turn and verdict output with Ollama's JSON-schema `format` option (set 0 to compare without)
+CONSTRAINED_JSON = os.getenv("OLLAMA_CONSTRAINED_JSON", "1").lower() not in ("0", "false", "no")
+
+# Cancel a generation once its JSON object is complete instead of letting it run to num_predict.
+# Applies only without OLLAMA_CONSTRAINED_JSON (constrained output already ends at the brace), and
+# never to /debates/{id} turns: those need the context of a completed generation for the next round.
+EARLY_STOP = os.getenv("OLLAMA_EARLY_STOP", "1").lower() not in ("0", "false", "no")
+
+from services.hedging import HedgePolicy, hedged_retry
+from services.json_stream import JsonFieldStream, JsonObjectScanner, first_object, parse_object
+from services.llm_cache import LLMCache
+from services.ollama_client import OllamaClient, use_llm_cache
+from services.prompt_context import PromptContextStore, RoundContexts
+from services.scheduler import ModelScheduler, Priority, SchedulerSaturated
+
+# Response cache under call_ollama. LLM_CACHE_SIZE=0 disables it; LLM_CACHE_DB adds a SQLite tier.
+llm_cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    deterministic_ttl=float(os.getenv("LLM_CACHE_DETERMINISTIC_TTL", "86400")),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+)
 
+# Admission control in front of the model server: OLLAMA_MAX_CONCURRENCY upstream calls at once,
+# a bounded priority queue per call class behind them
+scheduler = ModelScheduler(
+    max_concurrency=max(1, int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))),
+    queue_limits={
+        Priority.INTERACTIVE: int(os.getenv("QUEUE_LIMIT_INTERACTIVE", "64")),
+        Priority.JUDGE: int(os.getenv("QUEUE_LIMIT_JUDGE", "32")),
+        Priority.RETRY: int(os.getenv("QUEUE_LIMIT_RETRY", "32")),
+        Priority.BACKGROUND: int(os.getenv("QUEUE_LIMIT_BACKGROUND", "8")),
+    },
+    max_wait=float(os.getenv("QUEUE_MAX_WAIT", "120")),
+)
 
+# One shared, pooled async client for every Ollama call.
+# connect/read are per-phase httpx timeouts; total bounds the whole call (including pool wait).
+ollama = OllamaClient(
+    OLLAMA_API,
+    MODEL,
+    api_key=OLLAMA_API_KEY,
+    connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "240")),
+    total_timeout=float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "240")),
+    max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32")),
+    cache=llm_cache,
+    scheduler=scheduler,
+)
 
-import re
+# Ollama context handles per (debate session, agent) so later rounds skip re-evaluating the shared prefix.
+# Only the /debates/{id} endpoints use them: the stateless ones have no debate identity to key by.
+prompt_contexts = PromptContextStore(
+    max_entries=int(os.getenv("PROMPT_CONTEXT_SIZE", "256")),
+    ttl=float(os.getenv("PROMPT_CONTEXT_TTL", "3600")),
+    max_tokens=int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "1500")),
+)
+
+# Hedged retries: a turn slower than the HEDGE_PERCENTILE latency gets its retry started early.
+# HEDGE_BUDGET caps backups as a fraction of turns (0 disables, at most 1.0 = double load).
+hedge_policy = HedgePolicy(
+    scheduler,
+    percentile=float(os.getenv("HEDGE_PERCENTILE", "90")),
+    budget=float(os.getenv("HEDGE_BUDGET", "0.2")),
+    min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+)
 
-def clamp_json(s: str, fallback: dict) -> dict:
+async def call_ollama(system_prompt: str, user_prompt: str, num_predict: int = 400, temp: float = 0.7, top_p: float = 0.9, repeat_penalty: float = 1.1,
+                      connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None, total_timeout: Optional[float] = None,
+                      use_cache: Optional[bool] = None, priority: Priority = Priority.INTERACTIVE) -> str:
+    return await ollama.generate(
+        system_prompt, user_prompt,
+        num_predict=num_predict, temp=temp, top_p=top_p, repeat_penalty=repeat_penalty,
+        connect_timeout=connect_timeout, read_timeout=read_timeout, total_timeout=total_timeout,
+        use_cache=use_cache, priority=priority,
+    )
+
+
+
+def clamp_json(s: str, fallback: dict, required=("stance", "argument")) -> dict:
     """
-    Robust JSON extractor:
-    1) prefer ```json ... ``` fenced blocks
-    2) else scan all {...} objects and return the first that has 'stance' and 'argument'
-    3) else return the first valid {...}
+    Robust JSON extractor, one pass over the text:
+    1) scan balanced {...} objects (fenced or not) and return the first that has the `required` keys
+    2) else return the first valid {...}
+    3) else salvage complete "stance"/"argument" strings from a truncated object
     4) else fallback with raw
     """
     try:
         text = s.strip()
 
-        # 1) fenced ```json blocks
-        fence = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL | re.IGNORECASE)
-        if fence:
-            try:
-                return json.loads(fence.group(1))
-            except json.JSONDecodeError:
-                pass
-
-        # 2) Try to parse the entire text as JSON first
-        try:
-            j = json.loads(text)
-            if isinstance(j, dict) and "stance" in j and "argument" in j:
+        # Constrained output is usually exactly one object
+        if text.startswith("{") and text.endswith("}"):
+            j = parse_object(text)
+            if j is not None and all(k in j for k in required):
                 return j
-        except json.JSONDecodeError:
-            pass
-
-        # 3) scan for any JSON objects, prefer ones with both keys
-        objs = re.findall(r"\{.*?\}", text, re.DOTALL)
-        best = None
-        for m in objs:
-            try:
-                j = json.loads(m)
-                if isinstance(j, dict):
-                    if "stance" in j and "argument" in j:
-                        return j
-                    if best is None:
-                        best = j
-            except json.JSONDecodeError:
-                continue
 
+        # 1) + 2) lazily, stopping at the first object with the required keys
+        match, best = first_object(JsonObjectScanner(), text, required)
+        if match is not None:
+            return match
         if best is not None:
             return best
 
-        # 3) Try to extract stance and argument separately if JSON parsing fails
-        stance_match = re.search(r'"stance"\s*:\s*"([^"]*)"', text, re.IGNORECASE)
-        arg_match = re.search(r'"argument"\s*:\s*"([^"]+)"', text, re.DOTALL | re.IGNORECASE)
+        # 3) Try to extract stance and argument separately if no object closed
+        stance_field, arg_field = JsonFieldStream("stance"), JsonFieldStream("argument")
+        if '"argument"' in text:
+            stance_field.feed(text)
+            arg_field.feed(text)
         
-        if stance_match and arg_match:
-            raw_stance = stance_match.group(1).strip().upper()
+        if stance_field.complete and arg_field.complete and arg_field.value:
+            raw_stance = stance_field.value.strip().upper()
             # Clean stance to only valid values
             if raw_stance in ["A", "B", "SAME"]:
                 clean_stance = raw_stance
@@ -116,7 +155,7 @@ def clamp_json(s: str, fallback: dict) -> dict:
             
             return {
                 "stance": clean_stance,
-                "argument": arg_match.group(1)
+                "argument": arg_field.value
             }
 
         return fallback | {"_debug": text[:500]}
@@ -150,6 +189,42 @@ VIRTUE_SYS = (
     "Respond in compact JSON only."
 )
 
+# JSON shapes enforced through Ollama's `format` option
+OPENING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "stance": {"type": "string", "enum": ["A", "B"]},
+        "argument": {"type": "string"},
+    },
+    "required": ["stance", "argument"],
+}
+
+COUNTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "stance": {"type": "string", "enum": ["A", "B", "same"]},
+        "argument": {"type": "string"},
+    },
+    "required": ["stance", "argument"],
+}
+
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scores": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "additionalProperties": {"type": "integer", "minimum": 0, "maximum": 2},
+            },
+        },
+        "final_recommendation": {"type": "string", "enum": ["A", "B"]},
+        "confidence": {"type": "integer", "minimum": 0, "maximum": 100},
+        "verdict": {"type": "string"},
+    },
+    "required": ["scores", "final_recommendation", "confidence", "verdict"],
+}
+
 JUDGE_SYS = (
     "You are the Judge, a neutral evaluator of ethical reasoning. Given the dilemma and all rounds of debate, "
     "assign each agent scores from 0–2 for harm_minimization, rule_consistency, autonomy_respect, honesty, and fairness. "
@@ -173,17 +248,82 @@ class Transcript(BaseModel):
     dilemma: Dilemma
     turns: List[AgentTurn]
 
+class DebateCreateRequest(BaseModel):
+    dilemma: Dilemma
+    # Lets a debate begun on the stateless endpoints move to a server-held session
+    turns: List[AgentTurn] = []
+
 # Import custom agent models
 from models.custom_agent import CustomAgent, AgentCreationRequest, AgentUpdateRequest, AgentRating
 from services.agent_service import AgentService
-from services.enhancement_service import EnhancementService
+from services.enhancement_service import EnhancementCache, EnhancementService
+from services.job_queue import Job, JobQueue
+from services.debate_sessions import DebateSession, DebateSessionStore
+from services.participant_cache import Participant, ParticipantCache
 
 # Initialize services
-agent_service = AgentService()
-enhancement_service = EnhancementService()
+# AGENT_STORE=sqlite switches custom agent storage to data/agents/agents.sqlite3 (imports the JSON files once)
+agent_service = AgentService(backend=os.getenv("AGENT_STORE", "json"))
+# Enhancement results by normalized description; ENHANCEMENT_CACHE_SIZE=0 disables it
+enhancement_service = EnhancementService(EnhancementCache(
+    max_entries=int(os.getenv("ENHANCEMENT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ENHANCEMENT_CACHE_TTL", "86400")),
+))
+# Background agent creation: AGENT_JOB_WORKERS enhancements at a time, AGENT_JOB_QUEUE waiting
+agent_jobs = JobQueue(
+    workers=int(os.getenv("AGENT_JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("AGENT_JOB_QUEUE", "100")),
+    ttl=float(os.getenv("AGENT_JOB_TTL", "3600")),
+    # Shared by every worker using this agent store, so polls and Idempotency-Keys work across them
+    db_path=os.getenv("AGENT_JOB_DB", str(agent_service.storage_path / "jobs.sqlite3")) or None,
+)
+# Name, system prompt and prompt prefix per debate participant, built-ins included
+participants = ParticipantCache(agent_service)
+for _name, _sys in (("Deon", DEON_SYS), ("Conse", CONSE_SYS), ("Virtue", VIRTUE_SYS)):
+    participants.register(_name, _sys)
+# Server-held debate transcripts; DEBATE_SESSION_DB keeps them across restarts
+debate_sessions = DebateSessionStore(
+    lambda dilemma, turns: Transcript(dilemma=dilemma, turns=turns),
+    max_sessions=int(os.getenv("DEBATE_SESSION_SIZE", "1000")),
+    ttl=float(os.getenv("DEBATE_SESSION_TTL", "21600")),
+    db_path=os.getenv("DEBATE_SESSION_DB") or None,
+)
 
 # -------------------- APP CONFIG --------------------
-app = FastAPI(title="MirrorMinds API")
+# Custom agent usage counts are buffered in memory and written out every USAGE_FLUSH_INTERVAL seconds
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+
+async def flush_usage_periodically():
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(agent_service.flush_usage)
+        except Exception as e:
+            print(f"DEBUG usage flush failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(flush_usage_periodically())
+    # Index the agent catalog for search off the event loop, so the first search is fast too
+    indexer = asyncio.create_task(asyncio.to_thread(agent_service.warm_search_index))
+    agent_jobs.start()
+    yield
+    await agent_jobs.stop()
+    indexer.cancel()
+    flusher.cancel()
+    await asyncio.to_thread(agent_service.flush_usage)
+    # Release pooled Ollama connections on shutdown
+    await ollama.aclose()
+
+async def llm_cache_bypass(request: Request) -> None:
+    """Per-request cache bypass: send `Cache-Control: no-cache` or `?no_cache=true`"""
+    no_cache = (
+        "no-cache" in request.headers.get("cache-control", "").lower()
+        or request.query_params.get("no_cache", "").lower() in ("1", "true", "yes")
+    )
+    use_llm_cache.set(not no_cache)
+
+app = FastAPI(title="MirrorMinds API", lifespan=lifespan, dependencies=[Depends(llm_cache_bypass)])
 
 app.add_middleware(
     CORSMiddleware,
@@ -193,10 +333,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(SchedulerSaturated)
+async def scheduler_saturated(request: Request, exc: SchedulerSaturated):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.get("/")
 def root():
     return {"message": "MirrorMinds backend is running!"}
 
+@app.get("/metrics")
+def metrics():
+    """Counters for the model-call path (cache hit rate, etc.)"""
+    return {**ollama.stats(), "prompt_context": prompt_contexts.stats(), "hedging": hedge_policy.stats(),
+            "participants": participants.stats(), "enhancement_cache": enhancement_service.cache.stats(),
+            "agent_jobs": agent_jobs.stats(), "debate_sessions": debate_sessions.stats(),
+            "turns": turn_stats.stats()}
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: model queue depth and observed upstream latency; 503 while saturated"""
+    stats = scheduler.stats()
+    saturated = any(
+        scheduler.queue_limits[p] and stats["queue_depth"][p.name.lower()] >= scheduler.queue_limits[p]
+        for p in (Priority.INTERACTIVE, Priority.JUDGE)
+    )
+    body = {"ready": not saturated, **stats}
+    if saturated:
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(scheduler.retry_after())})
+    return body
+
 # -------------------- HELPERS --------------------
 def mk_base(d: Dilemma) -> str:
     return (
@@ -241,6 +410,141 @@ def has_valid_opponent(text: str, role: str) -> bool:
     # Must mention at least one opponent and have reasonable length
     return len(mentioned_opponents) > 0 and len(text.strip()) > 30
 
+async def fan_out(fn, items: list) -> list:
+    """Run async fn over items concurrently (bounded by MAX_PARALLEL_GENERATIONS), keeping input order."""
+    limit = asyncio.Semaphore(MAX_PARALLEL_GENERATIONS)
+
+    async def run(item):
+        async with limit:
+            return await fn(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        # One agent failed (SchedulerSaturated -> 429) or the client left: stop the others'
+        # generations instead of letting them hold model slots for an answer nobody gets
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def generate(system_prompt: str, user_prompt: str, emit=None, agent: Optional[str] = None,
+                   field: str = "argument", context: Optional[List[int]] = None,
+                   capture: Optional[dict] = None, required=("stance", "argument"), **options) -> str:
+    """call_ollama, or stream tokens through `emit` when serving an SSE endpoint.
+
+    Each streamed token is sent as a `token` event carrying the raw text and the newly
+    decoded characters of `field`, so clients can render the argument as it is written.
+    `context` continues from an earlier turn's context; with `capture`, Ollama's final
+    response body (the new context) is put in capture["result"] for the caller to keep
+    if the turn is kept (see RoundContexts). Without `capture`, generation stops early
+    once a JSON object with the `required` keys is complete (see EARLY_STOP); a captured
+    call runs to the end, since only a completed generation returns its context.
+    Text without such an object is not cached, so a bad answer isn't replayed.
+    """
+    options["cache_if"] = lambda text: first_object(JsonObjectScanner(), text, required)[0] is not None
+    if EARLY_STOP:
+        options["early_stop"] = required
+    if context:
+        options["context"] = context
+    if capture is not None:
+        options["on_result"] = lambda result: capture.update(result=result)
+
+    if emit is None:
+        return await ollama.generate(system_prompt, user_prompt, **options)
+
+    parser = JsonFieldStream(field)
+    parts = []
+    async for token in ollama.stream(system_prompt, user_prompt, **options):
+        parts.append(token)
+        await emit("token", {"agent": agent, "text": token, field: parser.feed(token)})
+    return "".join(parts).strip()
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(run) -> StreamingResponse:
+    """Run `run(emit)` in the background and stream everything it emits as server-sent events"""
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def emit(event: str, data) -> None:
+            await queue.put(sse_event(event, data))
+
+        async def worker():
+            try:
+                await run(emit)
+            except SchedulerSaturated as e:
+                await emit("error", {"detail": e.detail, "status": e.status_code, "retry_after": e.retry_after})
+            except Exception as e:
+                await emit("error", {"detail": str(e)[:200]})
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(worker())
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+            yield sse_event("done", {})
+        finally:
+            # Client went away (or we finished): stop any generation still running
+            task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def output_schema(schema: dict) -> Optional[dict]:
+    return schema if CONSTRAINED_JSON else None
+
+class TurnStats:
+    """Parse-failure and retry counters, split by output mode so constrained and
+    unconstrained runs can be compared"""
+
+    def __init__(self):
+        self._counts = {}
+
+    def _bucket(self, kind: str) -> dict:
+        mode = "constrained" if CONSTRAINED_JSON else "unconstrained"
+        return self._counts.setdefault(mode, {}).setdefault(
+            kind, {"turns": 0, "generations": 0, "parse_failures": 0, "retries": 0}
+        )
+
+    def record_parse(self, kind: str, parse_failed: bool) -> None:
+        c = self._bucket(kind)
+        c["generations"] += 1
+        c["parse_failures"] += int(parse_failed)
+
+    def record_turn(self, kind: str, retried: bool = False) -> None:
+        c = self._bucket(kind)
+        c["turns"] += 1
+        c["retries"] += int(retried)
+
+    def stats(self) -> dict:
+        out = {}
+        for mode, kinds in self._counts.items():
+            out[mode] = {
+                kind: {**c,
+                       "parse_failure_rate": round(c["parse_failures"] / c["generations"], 4) if c["generations"] else 0.0,
+                       "retry_rate": round(c["retries"] / c["turns"], 4) if c["turns"] else 0.0}
+                for kind, c in kinds.items()
+            }
+        return out
+
+turn_stats = TurnStats()
+
+def parse_turn(kind: str, raw: str, fallback: dict, required=("stance", "argument")) -> dict:
+    """clamp_json, counting parse failures (fallback returned) for /metrics"""
+    j = clamp_json(raw, fallback, required)
+    turn_stats.record_parse(kind, "_debug" in j)
+    return j
+
+def opening_ok(j: dict) -> bool:
+    return "_debug" not in j and j.get("argument") not in ["—", "-"]
+
 def latest_by_agent(turns: List["AgentTurn"]) -> dict:
     out = {}
     for t in turns:
@@ -259,198 +563,624 @@ def short_quote(s: str, maxlen: int = 160) -> str:
 
 # -------------------- ENDPOINTS --------------------
 @app.post("/openings")
-def openings(d: Dilemma):
+async def openings(d: Dilemma):
+    return {"turns": [turn.dict() for turn in await opening_round(d)]}
+
+async def opening_round(d: Dilemma, contexts: Optional[RoundContexts] = None) -> List[AgentTurn]:
+    """Opening arguments from the three built-in agents"""
     base = mk_base(d)
 
-    def gen(role: str, sys: str):
-        try:
-            raw = call_ollama(sys, base + "\n" + OPENING_INSTRUCT, num_predict=480, temp=0.65)
+    async def gen(role: str, sys: str):
+        fallback = {"stance": "A", "argument": f"[{role} failed to generate proper response]"}
+
+        async def first_try() -> dict:
+            capture = {} if contexts else None  # capturing the context rules out early stop
+            raw = await generate(sys, base + "\n" + OPENING_INSTRUCT, None, role, capture=capture,
+                                 json_schema=output_schema(OPENING_SCHEMA), num_predict=480, temp=0.65)
             print(f"DEBUG {role} raw response: {raw[:200]}...")  # Debug output
             
-            j = clamp_json(raw, {"stance": "A", "argument": f"[{role} failed to generate proper response]", "_raw": raw[:200]})
+            j = parse_turn("opening", raw, fallback | {"_raw": raw[:200]})
             print(f"DEBUG {role} parsed JSON: {j}")  # Debug output
-            
+            return dict(j, _result=capture and capture.get("result"))
+
+        async def second_try() -> dict:
             # If we got the fallback, try once more with different params
-            if j.get("argument") == "—" or "[failed to generate]" in j.get("argument", ""):
-                print(f"DEBUG {role} retrying...")
-                raw2 = call_ollama(sys, base + "\n" + OPENING_INSTRUCT, num_predict=400, temp=0.8)
-                j2 = clamp_json(raw2, j)
-                if j2.get("argument", "—") not in ["—", "-"]:
-                    j = j2
+            print(f"DEBUG {role} retrying...")
+            capture = {} if contexts else None
+            raw2 = await generate(sys, base + "\n" + OPENING_INSTRUCT, None, role, capture=capture,
+                                  json_schema=output_schema(OPENING_SCHEMA), num_predict=400, temp=0.8, priority=Priority.RETRY)
+            return dict(parse_turn("opening", raw2, fallback), _result=capture and capture.get("result"))
+
+        try:
+            j, retried = await hedged_retry(hedge_policy, first_try, second_try, opening_ok)
+            turn_stats.record_turn("opening", retried)
+            if contexts:
+                contexts.hold(contexts.key(sys, role), j["_result"])
             
             return AgentTurn(agent=role, stance=j.get("stance","A"), argument=j.get("argument","—"))
+        except SchedulerSaturated:
+            raise
         except Exception as e:
             print(f"DEBUG {role} exception: {str(e)}")  # Debug output
             return AgentTurn(agent=role, stance="A", argument=f"[{role} error: {str(e)[:100]}]")
 
-    return {"turns": [gen("Deon", DEON_SYS).dict(),
-                      gen("Conse", CONSE_SYS).dict(),
-                      gen("Virtue", VIRTUE_SYS).dict()]}
+    roles = [("Deon", DEON_SYS), ("Conse", CONSE_SYS), ("Virtue", VIRTUE_SYS)]
+    return await fan_out(lambda r: gen(*r), roles)
 
-# New endpoint for single agent response
-@app.post("/agent/{agent_name}")
-def single_agent(agent_name: str, d: Dilemma):
+async def opening_turn(agent_name: str, d: Dilemma, emit=None, contexts: Optional[RoundContexts] = None) -> AgentTurn:
+    """Opening argument for a single agent (default or custom)"""
     base = mk_base(d)
     
-    # Get system prompt for any agent (default or custom)
-    sys_prompt = get_agent_system_prompt(agent_name)
-    role = get_agent_display_name(agent_name)
-    
-    try:
-        raw = call_ollama(sys_prompt, base + "\n" + OPENING_INSTRUCT, num_predict=300, temp=0.65)
+    # Resolve any agent (default or custom) once for the whole turn; a custom agent may
+    # need a registry sync with the store, so it runs off the event loop
+    participant = await asyncio.to_thread(resolve_participant, agent_name)
+    sys_prompt = participant.system_prompt
+    role = participant.display_name
+    fallback = {"stance": "A", "argument": f"[{role} failed to generate proper response]"}
+
+    async def first_try() -> dict:
+        capture = {} if contexts else None
+        raw = await generate(sys_prompt, base + "\n" + OPENING_INSTRUCT, emit, role, capture=capture,
+                             json_schema=output_schema(OPENING_SCHEMA), num_predict=300, temp=0.65)
         print(f"DEBUG {role} raw response: {raw[:300]}...")  # Debug output
         
-        j = clamp_json(raw, {"stance": "A", "argument": f"[{role} failed to generate proper response]"})
+        j = parse_turn("opening", raw, fallback)
         print(f"DEBUG {role} parsed JSON: {j}")  # Debug output
+        return dict(j, _result=capture and capture.get("result"))
+
+    async def second_try() -> dict:
+        print(f"DEBUG {role} retrying...")
+        if emit:
+            await emit("retry", {"agent": role})
+        capture = {} if contexts else None
+        raw2 = await generate(sys_prompt, base + "\n" + OPENING_INSTRUCT, emit, role, capture=capture,
+                              json_schema=output_schema(OPENING_SCHEMA), num_predict=250, temp=0.8, priority=Priority.RETRY)
+        return dict(parse_turn("opening", raw2, fallback), _result=capture and capture.get("result"))
+
+    try:
+        # Streams retry sequentially: two racing token feeds would interleave on the client
+        j, retried = await hedged_retry(hedge_policy if emit is None else None, first_try, second_try, opening_ok)
+        turn_stats.record_turn("opening", retried)
+        # Openings start fresh but leave a context handle for the agent's later rounds
+        if contexts:
+            contexts.hold(contexts.key(sys_prompt, role), j["_result"])
         
-        if j.get("argument") == "—" or "[failed to generate]" in j.get("argument", ""):
-            print(f"DEBUG {role} retrying...")
-            raw2 = call_ollama(sys_prompt, base + "\n" + OPENING_INSTRUCT, num_predict=250, temp=0.8)
-            j2 = clamp_json(raw2, j)
-            if j2.get("argument", "—") not in ["—", "-"]:
-                j = j2
-        
-        return AgentTurn(agent=role, stance=j.get("stance","A"), argument=j.get("argument","—")).dict()
+        return AgentTurn(agent=role, stance=j.get("stance","A"), argument=j.get("argument","—"))
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         print(f"DEBUG {role} exception: {str(e)}")  # Debug output
-        return AgentTurn(agent=role, stance="A", argument=f"[{role} error: {str(e)[:100]}]").dict()
+        return AgentTurn(agent=role, stance="A", argument=f"[{role} error: {str(e)[:100]}]")
 
-@app.post("/continue")
-def continue_round(t: Transcript):
-    base = mk_base(t.dilemma)
+# New endpoint for single agent response
+@app.post("/agent/{agent_name}")
+async def single_agent(agent_name: str, d: Dilemma):
+    return (await opening_turn(agent_name, d)).dict()
+
+@app.post("/agent/{agent_name}/stream")
+async def single_agent_stream(agent_name: str, d: Dilemma):
+    """SSE version of /agent/{agent_name}: `token` events, then a final `turn` event"""
+    async def run(emit):
+        turn = await opening_turn(agent_name, d, emit)
+        await emit("turn", turn.dict())
+
+    return sse_response(run)
+
+def debate_agents(t: Transcript) -> List[str]:
+    """Agents taking part in the next round, in a stable order"""
+    # Get unique agent names from the transcript, in order of first appearance
+    agent_names = list(dict.fromkeys(turn.agent for turn in t.turns))
+    
+    # If we have the default 3 agents, keep the canonical order
+    if len(agent_names) == 3 and all(name in ["Deon", "Conse", "Virtue"] for name in agent_names):
+        agent_names = ["Deon", "Conse", "Virtue"]
+    return agent_names
+
+async def counter_turn(role: str, t: Transcript, emit=None, contexts: Optional[RoundContexts] = None) -> AgentTurn:
+    """One rebuttal turn for `role` against the latest arguments in the transcript"""
     latest = latest_by_agent(t.turns)
+    participant = await asyncio.to_thread(resolve_participant, role)
+    sys = participant.system_prompt
+    # Continue from this agent's earlier turns in the same debate, if Ollama's context is still held
+    ctx_key = contexts.key(sys, role) if contexts else None
+    prior = contexts.get(ctx_key) if contexts else None
+
+    # Build explicit opponent choices (cannot be self)
+    opponents = [name for name in ["Deon", "Conse", "Virtue"] if name in latest and name != role]
+    
+    # Build a cleaner summary
+    opp_lines = []
+    for name in opponents:
+        arg_preview = latest[name].argument[:100].replace("\n", " ")
+        opp_lines.append(f"{name}: {arg_preview}...")
+
+    summary_for_user = "\n".join(opp_lines) if opp_lines else "No opponents to address."
+
+    # Very explicit prompt with clear example
+    prompt = (
+        participant.prompt_prefix + "Here are your opponents' latest arguments:\n\n"
+        + summary_for_user + "\n\n"
+        f"TASK: Pick ONE opponent (choose from: {', '.join(opponents)}) and respond to them.\n\n"
+        f"CRITICAL: Your argument MUST start with the opponent's name followed by a comma.\n"
+        f"Example format: 'Virtue, I disagree with your point because...'\n\n"
+        f"Write 4-6 sentences explaining your position from your ethical framework.\n\n"
+        'Return JSON: {"stance":"A","argument":"OpponentName, your response here..."}'
+    )
 
-    def respond(role: str, sys: str = None):
-        # Get system prompt if not provided
-        if sys is None:
-            sys = get_agent_system_prompt(role)
-        # Build explicit opponent choices (cannot be self)
-        opponents = [name for name in ["Deon", "Conse", "Virtue"] if name in latest and name != role]
-        
-        # Build a cleaner summary
-        opp_lines = []
-        for name in opponents:
-            arg_preview = latest[name].argument[:100].replace("\n", " ")
-            opp_lines.append(f"{name}: {arg_preview}...")
-
-        summary_for_user = "\n".join(opp_lines) if opp_lines else "No opponents to address."
-
-        # Very explicit prompt with clear example
-        prompt = (
-            f"You are {role}. Here are your opponents' latest arguments:\n\n"
-            + summary_for_user + "\n\n"
-            f"TASK: Pick ONE opponent (choose from: {', '.join(opponents)}) and respond to them.\n\n"
-            f"CRITICAL: Your argument MUST start with the opponent's name followed by a comma.\n"
-            f"Example format: 'Virtue, I disagree with your point because...'\n\n"
-            f"Write 4-6 sentences explaining your position from your ethical framework.\n\n"
-            'Return JSON: {"stance":"A","argument":"OpponentName, your response here..."}'
-        )
+    # first try
+    async def first_try() -> dict:
+        capture = {} if contexts else None
+        raw = await generate(sys, prompt, emit, role, context=prior, capture=capture,
+                             json_schema=output_schema(COUNTER_SCHEMA), num_predict=400, temp=0.65)
+        return dict(parse_turn("counter", raw, {"stance": "same", "argument": "—"}), _result=capture and capture.get("result"))
 
-        # first try
-        raw = call_ollama(sys, prompt, num_predict=400, temp=0.65)
-        j = clamp_json(raw, {"stance": "same", "argument": "—"})
+    # validate: must mention opponent and have content; else retry with VERY explicit format
+    def counter_ok(j: dict) -> bool:
         arg = j.get("argument", "—").strip()
+        return arg not in ["—", "-", ""] and has_valid_opponent(arg, role)
+
+    async def second_try() -> dict:
+        # Force the format by being extremely explicit
+        retry_prompt = (
+            participant.prompt_prefix + "Respond to ONE of these opponents:\n"
+            + "\n".join([f"- {name}" for name in opponents]) + "\n\n"
+            f"Your response MUST begin with one of these exact phrases:\n"
+            + "\n".join([f'- "{name}, "' for name in opponents]) + "\n\n"
+            f"Then continue with your argument (4-6 sentences).\n\n"
+            f'Example: "Virtue, I believe your focus on character overlooks the practical consequences..."\n\n'
+            'JSON format: {"stance":"A","argument":"OpponentName, your full response..."}'
+        )
+        if emit:
+            await emit("retry", {"agent": role})
+        capture = {} if contexts else None
+        raw2 = await generate(sys, retry_prompt, emit, role, context=prior, capture=capture,
+                              json_schema=output_schema(COUNTER_SCHEMA), num_predict=350, temp=0.7, priority=Priority.RETRY)
+        return dict(parse_turn("counter", raw2, {"stance": "same", "argument": "—"}), _result=capture and capture.get("result"))
+
+    j, retried = await hedged_retry(hedge_policy if emit is None else None, first_try, second_try, counter_ok,
+                                    usable=lambda j2: j2.get("argument", "—") not in ["—", "-", ""])
+    arg = j.get("argument", "—").strip()
+    turn_stats.record_turn("counter", retried)
+    if contexts:
+        contexts.hold(ctx_key, j["_result"], len(prior or []))
+
+    prev = next((x.stance for x in reversed(t.turns) if x.agent == role and x.stance), None)
+    raw_stance = j.get("stance", "same")
+    
+    # Clean and validate stance - only allow A, B, or same
+    stance = str(raw_stance).strip().upper()
+    if stance not in ["A", "B", "SAME"]:
+        # Try to extract A or B from the stance string
+        if "A" in stance and "B" not in stance:
+            stance = "A"
+        elif "B" in stance and "A" not in stance:
+            stance = "B"
+        else:
+            stance = "SAME"
+    
+    final_stance = prev if stance == "SAME" else stance
+    return AgentTurn(agent=role, stance=final_stance, argument=arg)
 
-        # validate: must mention opponent and have content; else retry with VERY explicit format
-        if (arg in ["—", "-", ""]) or (not has_valid_opponent(arg, role)):
-            # Force the format by being extremely explicit
-            retry_prompt = (
-                f"You are {role}. Respond to ONE of these opponents:\n"
-                + "\n".join([f"- {name}" for name in opponents]) + "\n\n"
-                f"Your response MUST begin with one of these exact phrases:\n"
-                + "\n".join([f'- "{name}, "' for name in opponents]) + "\n\n"
-                f"Then continue with your argument (4-6 sentences).\n\n"
-                f'Example: "Virtue, I believe your focus on character overlooks the practical consequences..."\n\n'
-                'JSON format: {"stance":"A","argument":"OpponentName, your full response..."}'
-            )
-            raw2 = call_ollama(sys, retry_prompt, num_predict=350, temp=0.7)
-            j2 = clamp_json(raw2, {"stance": "same", "argument": "—"})
-            if j2.get("argument", "—") not in ["—", "-", ""]:
-                j = j2
-                arg = j.get("argument", "—").strip()
-
-        prev = next((x.stance for x in reversed(t.turns) if x.agent == role and x.stance), None)
-        raw_stance = j.get("stance", "same")
-        
-        # Clean and validate stance - only allow A, B, or same
-        stance = str(raw_stance).strip().upper()
-        if stance not in ["A", "B", "SAME"]:
-            # Try to extract A or B from the stance string
-            if "A" in stance and "B" not in stance:
-                stance = "A"
-            elif "B" in stance and "A" not in stance:
-                stance = "B"
-            else:
-                stance = "SAME"
-        
-        final_stance = prev if stance == "SAME" else stance
-        return AgentTurn(agent=role, stance=final_stance, argument=arg)
+async def counter_round(t: Transcript, contexts: Optional[RoundContexts] = None) -> List[AgentTurn]:
+    # Agents respond concurrently; fan_out keeps the output order stable
+    return await fan_out(lambda role: counter_turn(role, t, contexts=contexts), debate_agents(t))
 
-    # Get unique agent names from the transcript
-    agent_names = list(set(turn.agent for turn in t.turns))
-    
-    # If we have the default 3 agents, use them
-    if len(agent_names) == 3 and all(name in ["Deon", "Conse", "Virtue"] for name in agent_names):
-        return {"turns": [respond("Deon").dict(),
-                          respond("Conse").dict(),
-                          respond("Virtue").dict()]}
-    else:
-        # Use the agents from the transcript
-        return {"turns": [respond(agent_name).dict() for agent_name in agent_names]}
+@app.post("/continue")
+async def continue_round(t: Transcript):
+    return {"turns": [turn.dict() for turn in await counter_round(t)]}
 
-@app.post("/judge")
-def judge(t: Transcript):
+@app.post("/continue/stream")
+async def continue_round_stream(t: Transcript):
+    """SSE version of /continue: interleaved `token` events, one `turn` event per agent"""
+    async def run(emit):
+        async def respond(role: str):
+            turn = await counter_turn(role, t, emit)
+            await emit("turn", turn.dict())
+
+        await fan_out(respond, debate_agents(t))
+
+    return sse_response(run)
+
+async def judge_verdict(t: Transcript, emit=None) -> dict:
     judge_input = {"dilemma": t.dilemma.dict(), "transcript": [x.dict() for x in t.turns]}
-    raw = call_ollama(JUDGE_SYS, json.dumps(judge_input), num_predict=280, temp=0.25)
-    return clamp_json(raw, {"scores":{}, "final_recommendation":"A","confidence":50,"verdict":"—"})
+    raw = await generate(JUDGE_SYS, json.dumps(judge_input), emit, "Judge", field="verdict",
+                         required=("final_recommendation", "verdict"), json_schema=output_schema(JUDGE_SCHEMA), num_predict=280, temp=0.25, priority=Priority.JUDGE)
+    verdict = parse_turn("judge", raw, {"scores":{}, "final_recommendation":"A","confidence":50,"verdict":"—"},
+                         required=("final_recommendation", "verdict"))
+    turn_stats.record_turn("judge")
+    return verdict
+
+@app.post("/judge")
+async def judge(t: Transcript):
+    return await judge_verdict(t)
+
+@app.post("/judge/stream")
+async def judge_stream(t: Transcript):
+    """SSE version of /judge: `token` events, then a final `verdict` event"""
+    async def run(emit):
+        await emit("verdict", await judge_verdict(t, emit))
+
+    return sse_response(run)
+
+# -------------------- DEBATE SESSION ENDPOINTS --------------------
+# The same rounds as above, but the transcript stays on the server: clients send only the
+# debate id and get back only the new turns, so a round costs the same at turn 3 or 300.
+
+# Session store calls go through asyncio.to_thread: with DEBATE_SESSION_DB set each one commits to SQLite
+
+async def get_debate_session(debate_id: str) -> DebateSession:
+    session = await asyncio.to_thread(debate_sessions.get, debate_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Debate not found")
+    return session
+
+async def keep_turns(session: DebateSession, turns: List[AgentTurn], contexts: RoundContexts) -> None:
+    """Store the new turns, then the Ollama context handles of exactly those turns"""
+    await asyncio.to_thread(debate_sessions.append_turns, session, turns)
+    saved_ms = contexts.commit()
+    if saved_ms:
+        print(f"DEBUG debate {session.id[:8]} reused prompt context, ~{saved_ms:.0f}ms prompt eval saved")
+
+def debate_delta(session: DebateSession, turns: List[AgentTurn]) -> dict:
+    return {"debate_id": session.id, "turns": [turn.dict() for turn in turns],
+            "turn_count": len(session.transcript.turns)}
+
+@app.post("/debates", status_code=201)
+def create_debate(request: DebateCreateRequest):
+    """Start a server-held debate; later rounds only need the returned id"""
+    session = debate_sessions.create(request.dilemma.dict(), [turn.dict() for turn in request.turns])
+    return {"debate_id": session.id, "turn_count": len(session.transcript.turns)}
+
+@app.get("/debates/{debate_id}")
+async def get_debate(debate_id: str, since: int = 0):
+    """Stored transcript from turn index `since` on (to resync a client) and the verdict, if judged"""
+    session = await get_debate_session(debate_id)
+    t = session.transcript
+    return {"debate_id": session.id, "dilemma": t.dilemma.dict(),
+            "turns": [turn.dict() for turn in t.turns[max(0, since):]],
+            "turn_count": len(t.turns), "verdict": session.verdict}
+
+@app.delete("/debates/{debate_id}")
+def delete_debate(debate_id: str):
+    if not debate_sessions.delete(debate_id):
+        raise HTTPException(status_code=404, detail="Debate not found")
+    return {"message": "Debate deleted successfully"}
+
+@app.post("/debates/{debate_id}/openings")
+async def debate_openings(debate_id: str):
+    session = await get_debate_session(debate_id)
+    contexts = RoundContexts(prompt_contexts, session.id)
+    turns = await opening_round(session.transcript.dilemma, contexts)
+    await keep_turns(session, turns, contexts)
+    return debate_delta(session, turns)
+
+# Openings depend only on the dilemma, so they don't take the session lock and several
+# agents can open at once; each turn is stored as it finishes
+@app.post("/debates/{debate_id}/agent/{agent_name}")
+async def debate_single_agent(debate_id: str, agent_name: str):
+    session = await get_debate_session(debate_id)
+    contexts = RoundContexts(prompt_contexts, session.id)
+    turn = await opening_turn(agent_name, session.transcript.dilemma, contexts=contexts)
+    await keep_turns(session, [turn], contexts)
+    return debate_delta(session, [turn])
+
+@app.post("/debates/{debate_id}/agent/{agent_name}/stream")
+async def debate_single_agent_stream(debate_id: str, agent_name: str):
+    """SSE: `token` events, a `turn` event, then `saved` once the turn is stored"""
+    session = await get_debate_session(debate_id)
+
+    async def run(emit):
+        contexts = RoundContexts(prompt_contexts, session.id)
+        turn = await opening_turn(agent_name, session.transcript.dilemma, emit, contexts)
+        await emit("turn", turn.dict())
+        await keep_turns(session, [turn], contexts)
+        await emit("saved", {"debate_id": session.id, "turn_count": len(session.transcript.turns)})
+
+    return sse_response(run)
+
+@app.post("/debates/{debate_id}/continue")
+async def debate_continue(debate_id: str):
+    session = await get_debate_session(debate_id)
+    # One round at a time per debate: a concurrent retry waits instead of answering the same round twice
+    async with session.lock:
+        contexts = RoundContexts(prompt_contexts, session.id)
+        turns = await counter_round(session.transcript, contexts)
+        await keep_turns(session, turns, contexts)
+    return debate_delta(session, turns)
+
+@app.post("/debates/{debate_id}/continue/stream")
+async def debate_continue_stream(debate_id: str):
+    """SSE: interleaved `token` events, one `turn` event per agent, then `saved` once the round is stored"""
+    session = await get_debate_session(debate_id)
+
+    async def run(emit):
+        async with session.lock:
+            contexts = RoundContexts(prompt_contexts, session.id)
+
+            async def respond(role: str) -> AgentTurn:
+                turn = await counter_turn(role, session.transcript, emit, contexts)
+                await emit("turn", turn.dict())
+                return turn
+
+            # A client that disconnects mid-round cancels it, and nothing (turns or contexts) is stored
+            turns = await fan_out(respond, debate_agents(session.transcript))
+            await keep_turns(session, turns, contexts)
+        await emit("saved", {"debate_id": session.id, "turn_count": len(session.transcript.turns)})
+
+    return sse_response(run)
+
+@app.post("/debates/{debate_id}/judge")
+async def debate_judge(debate_id: str):
+    session = await get_debate_session(debate_id)
+    async with session.lock:
+        verdict = await judge_verdict(session.transcript)
+        await asyncio.to_thread(debate_sessions.set_verdict, session, verdict)
+    return verdict
+
+@app.post("/debates/{debate_id}/judge/stream")
+async def debate_judge_stream(debate_id: str):
+    """SSE: `token` events, then a final `verdict` event"""
+    session = await get_debate_session(debate_id)
+
+    async def run(emit):
+        async with session.lock:
+            verdict = await judge_verdict(session.transcript, emit)
+            await asyncio.to_thread(debate_sessions.set_verdict, session, verdict)
+        await emit("verdict", verdict)
+
+    return sse_response(run)
 
 # -------------------- CUSTOM AGENT ENDPOINTS --------------------
 
+async def build_custom_agent(request: AgentCreationRequest, force: bool = False, job: Optional[Job] = None) -> dict:
+    """Enhance the description, then create the agent (inline or as a background job)"""
+    if job:
+        job.progress("enhancing")
+    # Enhance the description
+    enhancement = await enhancement_service.enhance_agent_description(request.description, force)
+    
+    # Generate system prompt
+    system_prompt = enhancement_service.generate_system_prompt(
+        enhancement.enhanced_prompt, 
+        request.name
+    )
+    
+    if job:
+        job.progress("saving")
+    # Create the agent; the store write (fsync, cross-process lock) runs off the event loop
+    agent = await asyncio.to_thread(
+        agent_service.create_agent,
+        request, 
+        enhancement.enhanced_prompt, 
+        system_prompt
+    )
+    
+    return jsonable_encoder({
+        "agent": agent.dict(),
+        "enhancement": enhancement.dict()
+    })
+
+async def submit_agent_job(request: AgentCreationRequest, force: bool, idempotency_key: Optional[str]) -> Job:
+    """Queue agent creation; a retry with the same Idempotency-Key gets the existing job back"""
+    fingerprint = hashlib.sha256(json.dumps([request.dict(), force], sort_keys=True).encode("utf-8")).hexdigest()
+    use_cache = use_llm_cache.get()
+
+    async def run(job: Job) -> dict:
+        # Workers outlive the request, so carry its cache bypass over explicitly
+        use_llm_cache.set(use_cache)
+        try:
+            return await build_custom_agent(request, force, job)
+        except ValueError as e:
+            # Keeps the 400 for a waiter in another worker, which only sees the stored status
+            raise HTTPException(status_code=400, detail=str(e))
+
+    job, created = await agent_jobs.submit("create_agent", run, idempotency_key, fingerprint)
+    if not created and job.fingerprint != fingerprint:
+        raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different request")
+    return job
+
 @app.post("/api/agents/create")
-def create_custom_agent(request: AgentCreationRequest):
-    """Create a new custom agent with AI enhancement"""
+async def create_custom_agent(request: AgentCreationRequest, force: bool = False, background: bool = False,
+                              idempotency_key: Optional[str] = Header(None)):
+    """Create a new custom agent with AI enhancement.
+
+    `?background=true` answers 202 with a job to poll at /api/jobs/{id} instead of waiting
+    for the model. With an Idempotency-Key header, retries attach to the first submission.
+    """
     try:
-        # Enhance the description
-        enhancement = enhancement_service.enhance_agent_description(request.description)
-        
-        # Generate system prompt
-        system_prompt = enhancement_service.generate_system_prompt(
-            enhancement.enhanced_prompt, 
-            request.name
-        )
-        
-        # Create the agent
-        agent = agent_service.create_agent(
-            request, 
-            enhancement.enhanced_prompt, 
-            system_prompt
-        )
-        
-        return {
-            "agent": agent.dict(),
-            "enhancement": enhancement.dict()
-        }
+        if background or idempotency_key:
+            job = await submit_agent_job(request, force, idempotency_key)
+            if background:
+                return JSONResponse(status_code=202, content={"job": jsonable_encoder(job.snapshot())},
+                                    headers={"Location": f"/api/jobs/{job.id}"})
+            while not job.done:
+                await job.wait(len(job.events))
+            if job.status == "failed":
+                # A job run by another worker comes back without its exception
+                raise job.exception or HTTPException(status_code=job.error_status or 500, detail=job.error)
+            return job.result
+
+        return await build_custom_agent(request, force)
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create agent: {str(e)}")
 
+# Largest catalog accepted by one /api/agents/import call
+AGENT_IMPORT_MAX_ITEMS = int(os.getenv("AGENT_IMPORT_MAX_ITEMS", "1000"))
+
+def parse_import_items(body: bytes) -> list:
+    """Items of a JSON list, or of JSONL (one object per line; a bad line becomes its error)"""
+    text = body.decode("utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    items = []
+    for line in text.splitlines():
+        if line.strip():
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+    return items
+
+@app.post("/api/agents/import")
+async def import_agents(request: Request, force: bool = False):
+    """Bulk-create agents from a JSON list or JSONL of AgentCreationRequest objects (SSE).
+
+    One `item` event per agent as it is rejected (invalid, duplicate) or enhanced, with as
+    many enhancements in flight as the model allows. Then every enhanced agent is written
+    in a single store write, reported by one `committed` event.
+    """
+    try:
+        raw_items = parse_import_items(await request.body())
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid import body: {e}")
+    if not isinstance(raw_items, list) or not raw_items:
+        raise HTTPException(status_code=400, detail="Expected a non-empty list of agents")
+    if len(raw_items) > AGENT_IMPORT_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {AGENT_IMPORT_MAX_ITEMS} agents per import")
+
+    async def run(emit):
+        requests = {}
+        for index, raw in enumerate(raw_items):
+            try:
+                if isinstance(raw, Exception):
+                    raise ValueError(f"Invalid JSON: {raw}")
+                requests[index] = AgentCreationRequest(**raw)
+            except (ValidationError, TypeError, ValueError) as e:
+                await emit("item", {"index": index, "status": "invalid", "detail": str(e)[:300]})
+
+        # Against the catalog, the default agents and the rest of the batch, in one pass
+        conflicts = await asyncio.to_thread(agent_service.name_conflicts, [r.name for r in requests.values()])
+        for (index, req), conflict in zip(list(requests.items()), conflicts):
+            if conflict:
+                del requests[index]
+                await emit("item", {"index": index, "name": req.name, "status": "duplicate", "detail": conflict})
+
+        # Enough in flight to keep every model slot busy; the scheduler queues the rest as background work
+        limit = asyncio.Semaphore(scheduler.max_concurrency)
+
+        async def enhance(index: int, req: AgentCreationRequest):
+            try:
+                async with limit:
+                    enhancement = await enhancement_service.enhance_agent_description(req.description, force)
+            except Exception as e:
+                return index, None, getattr(e, "detail", None) or str(e)
+            system_prompt = enhancement_service.generate_system_prompt(enhancement.enhanced_prompt, req.name)
+            return index, (req, enhancement.enhanced_prompt, system_prompt), None
+
+        ready = {}
+        for finished in asyncio.as_completed([enhance(i, r) for i, r in requests.items()]):
+            index, item, error = await finished
+            if item is None:
+                await emit("item", {"index": index, "name": requests[index].name, "status": "failed", "detail": error})
+            else:
+                ready[index] = item
+                await emit("item", {"index": index, "name": requests[index].name, "status": "enhanced"})
+
+        order = sorted(ready)
+        agents = await asyncio.to_thread(agent_service.create_agents, [ready[i] for i in order]) if order else []
+        await emit("committed", {
+            "created": len(agents),
+            "skipped": len(raw_items) - len(agents),
+            "agents": [{"index": i, "id": agent.id, "name": agent.name} for i, agent in zip(order, agents)],
+        })
+
+    return sse_response(run)
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status, current stage and (once finished) result or error of a background job"""
+    job = agent_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job": jsonable_encoder(job.snapshot())}
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """SSE progress for a background job: one `progress` event per stage, then a final `job` event"""
+    job = await asyncio.to_thread(agent_jobs.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def run(emit):
+        seen = 0
+        while True:
+            await job.wait(seen, timeout=15)
+            for event in job.events[seen:]:
+                await emit("progress", event)
+            seen = len(job.events)
+            if job.done:
+                await emit("job", jsonable_encoder(job.snapshot()))
+                return
+
+    return sse_response(run)
+
+# Largest page the agent listings serve in one response
+AGENT_PAGE_MAX_LIMIT = int(os.getenv("AGENT_PAGE_MAX_LIMIT", "1000"))
+
+def catalog_headers() -> dict:
+    """Validators for agent listings: they change exactly when the catalog version does"""
+    return {
+        "ETag": agent_service.catalog_etag,
+        "Last-Modified": formatdate(agent_service.catalog_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+def catalog_unchanged(request: Request, headers: dict) -> bool:
+    """Conditional GET: does the client's copy still match the catalog?"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(agent_service.catalog_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @app.get("/api/agents")
-def list_agents(public_only: bool = True, search: Optional[str] = None, limit: int = 50):
-    """List all available agents"""
+def list_agents(request: Request, public_only: bool = True, search: Optional[str] = None,
+                limit: int = Query(50, ge=1, le=AGENT_PAGE_MAX_LIMIT), cursor: Optional[str] = None):
+    """List all available agents; pages follow `next_cursor` (not used with `search`)"""
     try:
-        agents = agent_service.list_agents(public_only, search, limit)
-        return {"agents": [agent.dict() for agent in agents]}
+        headers = catalog_headers()
+        if catalog_unchanged(request, headers):
+            return Response(status_code=304, headers=headers)
+        if search:
+            agents, next_cursor = agent_service.list_agents(public_only, search, limit), None
+        else:
+            agents, next_cursor = agent_service.list_agents_page(public_only, limit, cursor)
+        return JSONResponse(jsonable_encoder({"agents": [agent.dict() for agent in agents], "next_cursor": next_cursor}),
+                            headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list agents: {str(e)}")
 
 @app.get("/api/agents/all")
-def get_all_available_agents():
+def get_all_available_agents(request: Request, limit: int = Query(50, ge=1, le=AGENT_PAGE_MAX_LIMIT),
+                             cursor: Optional[str] = None):
     """Get all agents (default + custom) in unified format"""
     try:
-        agents = agent_service.get_all_available_agents()
-        return {"agents": agents}
+        headers = catalog_headers()
+        if catalog_unchanged(request, headers):
+            return Response(status_code=304, headers=headers)
+        if cursor is None and limit == 50:
+            # The default first page is kept pre-serialized until the catalog changes
+            etag, body = agent_service.all_agents_snapshot()
+            return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag})
+        agents, next_cursor = agent_service.get_all_available_agents_page(limit, cursor)
+        return JSONResponse({"agents": agents, "next_cursor": next_cursor}, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get agents: {str(e)}")
 
@@ -467,8 +1197,20 @@ def get_agent(agent_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get agent: {str(e)}")
 
+@app.get("/api/agents/{agent_id}/ratings/summary")
+def get_agent_rating_summary(agent_id: str):
+    """Per-criterion rating averages for an agent, served from its running totals"""
+    try:
+        if not agent_service.get_agent(agent_id):
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return {"summary": agent_service.get_rating_summary(agent_id).dict()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get rating summary: {str(e)}")
+
 @app.put("/api/agents/{agent_id}")
-def update_agent(agent_id: str, request: AgentUpdateRequest):
+async def update_agent(agent_id: str, request: AgentUpdateRequest, force: bool = False):
     """Update an existing agent"""
     try:
         enhanced_prompt = None
@@ -476,14 +1218,14 @@ def update_agent(agent_id: str, request: AgentUpdateRequest):
         
         # If description is being updated, re-enhance it
         if request.description is not None:
-            enhancement = enhancement_service.enhance_agent_description(request.description)
+            enhancement = await enhancement_service.enhance_agent_description(request.description, force)
             enhanced_prompt = enhancement.enhanced_prompt
             system_prompt = enhancement_service.generate_system_prompt(
                 enhanced_prompt, 
                 request.name or "Agent"
             )
         
-        agent = agent_service.update_agent(agent_id, request, enhanced_prompt, system_prompt)
+        agent = await asyncio.to_thread(agent_service.update_agent, agent_id, request, enhanced_prompt, system_prompt)
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
         
@@ -493,6 +1235,8 @@ def update_agent(agent_id: str, request: AgentUpdateRequest):
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update agent: {str(e)}")
 
@@ -510,31 +1254,63 @@ def delete_agent(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete agent: {str(e)}")
 
 @app.post("/api/enhance")
-def enhance_description(request: dict):
+async def enhance_description(request: dict):
     """Enhance an agent description"""
     try:
         description = request.get("description", "")
         if not description or len(description) < 50:
             raise HTTPException(status_code=400, detail="Description must be at least 50 characters")
         
-        enhancement = enhancement_service.enhance_agent_description(description)
+        # "force": true asks the model again instead of reusing a cached enhancement
+        enhancement = await enhancement_service.enhance_agent_description(description, bool(request.get("force")))
         return enhancement.dict()
         
     except HTTPException:
         raise
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to enhance description: {str(e)}")
 
+# Most descriptions one /api/analyze/batch call will score
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "10000"))
+
+@app.post("/api/analyze/batch")
+def analyze_batch(request: dict):
+    """Score many descriptions without enhancing them.
+
+    Send {"descriptions": [...]}, or {"catalog": true} to re-score every custom agent
+    (e.g. after the heuristics changed).
+    """
+    try:
+        if request.get("catalog"):
+            agents = agent_service.all_custom_agents()
+            results = enhancement_service.analyze_batch([agent.description for agent in agents])
+            return {"results": [{"agent_id": agent.id, "name": agent.name, **result}
+                                for agent, result in zip(agents, results)]}
+
+        descriptions = request.get("descriptions")
+        if not isinstance(descriptions, list) or not all(isinstance(d, str) for d in descriptions):
+            raise HTTPException(status_code=400, detail='Expected "descriptions" (a list of strings) or "catalog": true')
+        if len(descriptions) > ANALYZE_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {ANALYZE_BATCH_MAX_ITEMS} descriptions per call")
+        return {"results": enhancement_service.analyze_batch(descriptions)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to analyze descriptions: {str(e)}")
+
 @app.post("/api/agents/{agent_id}/regenerate")
-def regenerate_agent_prompt(agent_id: str):
+async def regenerate_agent_prompt(agent_id: str):
     """Regenerate the enhanced prompt for an existing agent"""
     try:
-        agent = agent_service.get_agent(agent_id)
+        agent = await asyncio.to_thread(agent_service.get_agent, agent_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
         
-        # Re-enhance the original description
-        enhancement = enhancement_service.enhance_agent_description(agent.description)
+        # Re-enhance the original description; regenerating always asks the model again
+        enhancement = await enhancement_service.enhance_agent_description(agent.description, force=True)
         system_prompt = enhancement_service.generate_system_prompt(
             enhancement.enhanced_prompt, 
             agent.name
@@ -542,7 +1318,8 @@ def regenerate_agent_prompt(agent_id: str):
         
         # Update the agent
         update_request = AgentUpdateRequest()
-        updated_agent = agent_service.update_agent(
+        updated_agent = await asyncio.to_thread(
+            agent_service.update_agent,
             agent_id, 
             update_request, 
             enhancement.enhanced_prompt, 
@@ -556,37 +1333,30 @@ def regenerate_agent_prompt(agent_id: str):
         
     except HTTPException:
         raise
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to regenerate agent: {str(e)}")
 
 # -------------------- CUSTOM AGENT DEBATE INTEGRATION --------------------
 
+def resolve_participant(agent_name: str) -> Participant:
+    """Display name, system prompt and prompt prefix for any agent (default or custom).
+
+    Counts one use of a custom agent; unknown agents argue as Deon under their own name.
+    """
+    participant = participants.resolve(agent_name)
+    if participant is None:
+        return Participant(agent_name, DEON_SYS)
+    if participant.agent_id:
+        agent_service.increment_usage(participant.agent_id)
+    return participant
+
 def get_agent_system_prompt(agent_name: str) -> str:
     """Get system prompt for any agent (default or custom)"""
-    # Check if it's a default agent
-    if agent_name.lower() == "deon":
-        return DEON_SYS
-    elif agent_name.lower() == "conse":
-        return CONSE_SYS
-    elif agent_name.lower() == "virtue":
-        return VIRTUE_SYS
-    else:
-        # Try to find custom agent
-        agent = agent_service.get_agent(agent_name)
-        if agent:
-            # Increment usage count
-            agent_service.increment_usage(agent_name)
-            return agent.system_prompt
-        else:
-            # Fallback to default if not found
-            return DEON_SYS
+    return resolve_participant(agent_name).system_prompt
 
 def get_agent_display_name(agent_identifier: str) -> str:
     """Get display name for any agent"""
-    # Check if it's a default agent
-    if agent_identifier.lower() in ["deon", "conse", "virtue"]:
-        return agent_identifier.capitalize()
-    else:
-        # Try to find custom agent
-        agent = agent_service.get_agent(agent_identifier)
-        return agent.name if agent else agent_identifier
+    participant = participants.resolve(agent_identifier)
+    return participant.display_name if participant else agent_identifier
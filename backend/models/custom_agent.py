@@ -33,6 +33,13 @@ class AgentRating(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now)
 
 
+class AgentRatingSummary(BaseModel):
+    agent_id: str
+    rating_count: int = Field(default=0)
+    average_rating: float = Field(default=0.0)
+    criteria: Dict[str, float] = Field(default_factory=dict)
+
+
 class EnhancementRequest(BaseModel):
     original_description: str
     enhanced_prompt: str
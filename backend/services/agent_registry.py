@@ -0,0 +1,178 @@
+# backend/services/agent_registry.py
+import gc
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.custom_agent import CustomAgent
+from services.agent_store import normalize_name
+from services.search_index import SearchIndex
+
+# Name matches count for more than description or prompt matches
+SEARCH_FIELDS = {"name": 3.0, "description": 1.0, "enhanced_prompt": 0.5}
+# What an agent is; anything else another writer changes is a counter (usage, rating aggregates)
+DEFINITION_FIELDS = ("name", "avatar", "description", "enhanced_prompt", "system_prompt", "created_by", "is_public")
+COUNTER_FIELDS = ("usage_count", "average_rating", "rating_count")
+
+
+class AgentRegistry:
+    """In-process index of custom agents by id and by normalized name.
+
+    AgentService loads it once from its store and updates it alongside every write, so
+    lookups during debate turns are dictionary hits instead of a re-read of the whole file.
+    `stamp` identifies the store version it was loaded from; the service reloads when the
+    store's stamp no longer matches (another process or a manual edit); `sync` applies
+    that change agent by agent instead of rebuilding everything.
+    """
+
+    def __init__(self):
+        self._agents: Dict[str, CustomAgent] = {}
+        self._by_name: Dict[str, str] = {}
+        self._search: Optional[SearchIndex] = None  # built on the first search, then kept in step
+        self._records: Dict[str, dict] = {}  # store record each agent was last loaded or saved as
+        self.stamp: Optional[tuple] = None
+        self.cursor: Optional[tuple] = None  # store change feed position, see AgentStore.changes_since
+        self.loads = 0
+        self.syncs = 0
+
+    normalize = staticmethod(normalize_name)
+
+    def load(self, records: Dict[str, dict], stamp: Optional[tuple],
+             pending_usage: Optional[Dict[str, int]] = None) -> None:
+        self._agents = {}
+        self._by_name = {}
+        self._records = {}
+        self._search = None
+        for record in records.values():
+            self._index(CustomAgent(**record))
+            self._records[record["id"]] = dict(record)
+        self._add_usage(pending_usage or {})
+        self.stamp = stamp
+        self.loads += 1
+
+    def _add_usage(self, deltas: Dict[str, int]) -> None:
+        for agent_id, delta in deltas.items():
+            agent = self._agents.get(agent_id)
+            if agent is not None:
+                agent.usage_count += delta
+
+    def sync(self, records: Dict[str, Optional[dict]], stamp: Optional[tuple],
+             pending_usage: Optional[Dict[str, int]] = None, complete: bool = True) -> Tuple[bool, bool]:
+        """Apply store records, touching only agents whose record changed.
+
+        `records` is either everything in the store (`complete`) or just the agents
+        written since the last sync, None marking a deletion. Counter-only changes
+        (another worker's usage flush or rating) are set in place. Agents whose definition
+        changed are re-parsed and re-indexed one at a time, so the search index survives.
+        `pending_usage` (increments not in the store yet) is added back to every usage
+        count taken from a record. Returns (anything changed, any definition changed).
+        """
+        pending_usage = pending_usage or {}
+        if self.loads == 0:
+            self.load(records, stamp, pending_usage)
+            return True, True
+        changed = redefined = False
+        gone = [agent_id for agent_id, record in records.items() if record is None]
+        if complete:
+            gone += [agent_id for agent_id in self._agents if agent_id not in records]
+        for agent_id in gone:
+            if self.remove(agent_id) is not None:
+                changed = redefined = True
+        for agent_id, record in records.items():
+            if record is None:
+                continue
+            known = self._records.get(agent_id)
+            if known == record:
+                continue
+            changed = True
+            agent = self._agents.get(agent_id)
+            if agent is None or known is None or any(known.get(f) != record.get(f) for f in DEFINITION_FIELDS):
+                agent = CustomAgent(**record)
+                self.put(agent)
+                redefined = True
+            else:
+                for field in COUNTER_FIELDS:
+                    if field in record:
+                        setattr(agent, field, record[field])
+            agent.usage_count += pending_usage.get(agent_id, 0)
+            self._records[agent_id] = dict(record)
+        self.stamp = stamp
+        self.syncs += 1
+        return changed, redefined
+
+    def _index(self, agent: CustomAgent) -> None:
+        self._agents[agent.id] = agent
+        self._by_name.setdefault(self.normalize(agent.name), agent.id)
+        if self._search is not None:
+            self._search.add(agent.id, self._search_fields(agent))
+
+    @staticmethod
+    def _search_fields(agent: CustomAgent) -> Dict[str, str]:
+        return {"name": agent.name, "description": agent.description, "enhanced_prompt": agent.enhanced_prompt}
+
+    @property
+    def search_ready(self) -> bool:
+        return self._search is not None
+
+    def build_search_index(self) -> None:
+        index = SearchIndex(SEARCH_FIELDS)
+        # The bulk build allocates millions of small dicts; cyclic GC passes over them only slow it down
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for agent in self._agents.values():
+                index.add(agent.id, self._search_fields(agent))
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._search = index
+
+    def search(self, query: str, limit: int = 50, public_only: bool = True) -> List[CustomAgent]:
+        """Best BM25 matches for the query, ties broken by (average_rating, usage_count)"""
+        if self._search is None:
+            self.build_search_index()
+        accept = (lambda agent_id: self._agents[agent_id].is_public) if public_only else None
+        hits = self._search.search(
+            query, limit, accept,
+            tiebreak=lambda agent_id: (self._agents[agent_id].average_rating, self._agents[agent_id].usage_count),
+        )
+        return [self._agents[agent_id] for agent_id, _ in hits]
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._agents
+
+    def get(self, agent_id: str) -> Optional[CustomAgent]:
+        return self._agents.get(agent_id)
+
+    def get_by_name(self, name: str) -> Optional[CustomAgent]:
+        agent_id = self._by_name.get(self.normalize(name))
+        return self._agents.get(agent_id) if agent_id else None
+
+    def values(self) -> Iterable[CustomAgent]:
+        return self._agents.values()
+
+    def put(self, agent: CustomAgent) -> None:
+        """Insert or replace an agent, keeping the name index in step"""
+        previous = self._agents.get(agent.id)
+        if previous is not None and self._by_name.get(self.normalize(previous.name)) == agent.id:
+            del self._by_name[self.normalize(previous.name)]
+        self._index(agent)
+        self._records[agent.id] = agent.dict()
+
+    def remove(self, agent_id: str) -> Optional[CustomAgent]:
+        agent = self._agents.pop(agent_id, None)
+        if agent is None:
+            return None
+        self._records.pop(agent_id, None)
+        if self._search is not None:
+            self._search.remove(agent_id)
+        key = self.normalize(agent.name)
+        if self._by_name.get(key) == agent_id:
+            del self._by_name[key]
+            # Another agent may have been shadowed by this one (legacy duplicate names)
+            for other in self._agents.values():
+                if self.normalize(other.name) == key:
+                    self._by_name[key] = other.id
+                    break
+        return agent
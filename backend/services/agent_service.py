@@ -1,59 +1,104 @@
 # backend/services/agent_service.py
+import base64
 import json
-import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
-from models.custom_agent import CustomAgent, AgentRating, AgentCreationRequest, AgentUpdateRequest
+from models.custom_agent import CustomAgent, AgentRating, AgentRatingSummary, AgentCreationRequest, AgentUpdateRequest
+from services.agent_registry import AgentRegistry
+from services.agent_store import RATING_CRITERIA, AgentStore, JsonAgentStore, SqliteAgentStore
 
 
 class AgentService:
-    def __init__(self, storage_path: str = "data/agents"):
+    def __init__(self, storage_path: str = "data/agents", backend: str = "json"):
         self.storage_path = Path(storage_path)
         self.agents_file = self.storage_path / "custom_agents.json"
         self.ratings_file = self.storage_path / "agent_ratings.json"
+        self.registry = AgentRegistry()
+        # Usage increments not yet written to the store, flushed by flush_usage()
+        self._pending_usage: Counter = Counter()
+        self._lock = threading.RLock()
+        # Bumped on every change visible in agent listings; with the boot id it makes the ETag
+        self.catalog_version = 0
+        self.catalog_modified = time.time()
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._snapshot: Optional[Tuple[str, bytes]] = None  # (etag, body) of /api/agents/all
+        # Bumped when an agent's name or prompts may have changed (not on usage or ratings)
+        self._definitions_version = 0
         
         # Create storage directory if it doesn't exist
         self.storage_path.mkdir(parents=True, exist_ok=True)
         
-        # Initialize files if they don't exist
-        if not self.agents_file.exists():
-            self._save_agents({})
-        if not self.ratings_file.exists():
-            self._save_ratings({})
-
-    def _load_agents(self) -> Dict[str, dict]:
-        """Load agents from JSON file"""
-        try:
-            with open(self.agents_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def _save_agents(self, agents: Dict[str, dict]) -> None:
-        """Save agents to JSON file"""
-        with open(self.agents_file, 'w', encoding='utf-8') as f:
-            json.dump(agents, f, indent=2, ensure_ascii=False, default=str)
-
-    def _load_ratings(self) -> Dict[str, dict]:
-        """Load ratings from JSON file"""
-        try:
-            with open(self.ratings_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        legacy = JsonAgentStore(self.agents_file, self.ratings_file)
+        if backend == "sqlite":
+            # Imports the JSON files once, the first time the database is created
+            self.store: AgentStore = SqliteAgentStore(self.storage_path / "agents.sqlite3", legacy)
+        elif backend == "json":
+            self.store = legacy
+        else:
+            raise ValueError(f"Unknown agent storage backend '{backend}'")
+
+    def _agents(self) -> AgentRegistry:
+        """The in-memory registry, reloaded only if the store changed underneath us"""
+        stamp = self.store.stamp()
+        if self.registry.loads == 0 or stamp != self.registry.stamp:
+            with self._lock:
+                stamp = self.store.stamp()
+                if self.registry.loads and stamp == self.registry.stamp:
+                    return self.registry  # another thread synced while we waited
+                # Only agents whose record changed are touched and the search index is kept;
+                # the change feed usually names them, so the store isn't re-read whole.
+                # Counts in the store don't include our unflushed increments yet.
+                changes = self.store.changes_since(self.registry.cursor) if self.registry.loads else None
+                if changes is None:
+                    cursor = self.store.change_cursor()
+                    changed, redefined = self.registry.sync(self.store.load_agents(), stamp, self._pending_usage)
+                else:
+                    cursor, records = changes
+                    changed, redefined = self.registry.sync(records, stamp, self._pending_usage, complete=False)
+                self.registry.cursor = cursor
+                if redefined:
+                    self._definitions_version += 1
+                if changed:
+                    self._changed()
+        return self.registry
+
+    def _changed(self) -> None:
+        self.catalog_version += 1
+        self.catalog_modified = time.time()
+
+    @property
+    def definitions_version(self) -> int:
+        """Changes whenever a cached copy of agent names or prompts may be stale"""
+        self._agents()
+        return self._definitions_version
+
+    @property
+    def catalog_etag(self) -> str:
+        self._agents()
+        return f'"{self._boot_id}-{self.catalog_version}"'
+
+    def _wrote(self) -> None:
+        """Our own write moved the store's stamp; don't treat it as a foreign change"""
+        self.registry.stamp = self.store.own_stamp(self.registry.stamp)
 
-    def _save_ratings(self, ratings: Dict[str, dict]) -> None:
-        """Save ratings to JSON file"""
-        with open(self.ratings_file, 'w', encoding='utf-8') as f:
-            json.dump(ratings, f, indent=2, ensure_ascii=False, default=str)
+    def _save(self, agent: CustomAgent) -> None:
+        """Write a whole agent through to the store"""
+        with self._lock:
+            self.registry.put(agent)
+            # The record carries the in-memory usage count, pending increments included
+            self._pending_usage.pop(agent.id, None)
+            self.store.save_agent(agent.dict())
+            self._wrote()
+            self._definitions_version += 1
+            self._changed()
 
     def create_agent(self, request: AgentCreationRequest, enhanced_prompt: str, system_prompt: str) -> CustomAgent:
         """Create a new custom agent"""
-        # Check for duplicate names (including default agents)
-        self._check_duplicate_name(request.name)
-        
         agent = CustomAgent(
             name=request.name,
             avatar=request.avatar,
@@ -62,168 +107,254 @@ class AgentService:
             system_prompt=system_prompt
         )
         
-        # Load existing agents
-        agents = self._load_agents()
-        
-        # Save agent
-        agents[agent.id] = agent.dict()
-        self._save_agents(agents)
+        self._agents()
+        with self._lock:
+            # Check for duplicate names (including default agents) in the same locked section as
+            # the save, so two concurrent creates can't both take the name
+            self._check_duplicate_name(request.name)
+            self._save(agent)
         
         return agent
+
+    def create_agents(self, items: List[Tuple[AgentCreationRequest, str, str]]) -> List[CustomAgent]:
+        """Create many agents (request, enhanced_prompt, system_prompt) with a single store write.
+
+        All or nothing: if any name is taken (see name_conflicts), nothing is created.
+        """
+        agents = [
+            CustomAgent(name=request.name, avatar=request.avatar, description=request.description,
+                        enhanced_prompt=enhanced_prompt, system_prompt=system_prompt)
+            for request, enhanced_prompt, system_prompt in items
+        ]
+        self._agents()
+        with self._lock:
+            # Re-checked under the lock: names may have been taken while the batch was enhanced
+            conflict = next((c for c in self.name_conflicts([a.name for a in agents]) if c), None)
+            if conflict:
+                raise ValueError(conflict)
+            for agent in agents:
+                self.registry.put(agent)
+            self.store.save_agents([agent.dict() for agent in agents])
+            self._wrote()
+            self._definitions_version += 1
+            self._changed()
+        return agents
+
+    def name_conflicts(self, names: List[str]) -> List[Optional[str]]:
+        """Duplicate-name error per name (None if free), in one pass over the name index.
+
+        Names are checked against default agents, existing custom agents and earlier names in the list.
+        """
+        agents = self._agents()
+        seen = set()
+        conflicts = []
+        for name in names:
+            key = agents.normalize(name)
+            conflict = self._name_conflict(name, agents)
+            if conflict is None and key in seen:
+                conflict = f"Agent name '{name}' appears more than once in this import."
+            seen.add(key)
+            conflicts.append(conflict)
+        return conflicts
     
     def _check_duplicate_name(self, name: str) -> None:
         """Check if agent name already exists (custom or default)"""
+        conflict = self._name_conflict(name, self._agents())
+        if conflict:
+            raise ValueError(conflict)
+
+    @staticmethod
+    def _name_conflict(name: str, agents: AgentRegistry) -> Optional[str]:
         name_lower = name.lower().strip()
         
         # Check against default agents
         default_names = ["deon", "conse", "virtue"]
         if name_lower in default_names:
-            raise ValueError(f"Agent name '{name}' conflicts with a default agent. Please choose a different name.")
+            return f"Agent name '{name}' conflicts with a default agent. Please choose a different name."
         
         # Check against existing custom agents
-        agents = self._load_agents()
-        for existing_agent in agents.values():
-            if existing_agent.get('name', '').lower().strip() == name_lower:
-                raise ValueError(f"Agent with name '{name}' already exists. Please choose a different name.")
+        if agents.get_by_name(name_lower) is not None:
+            return f"Agent with name '{name}' already exists. Please choose a different name."
+        return None
 
     def get_agent(self, agent_id: str) -> Optional[CustomAgent]:
         """Get a specific agent by ID"""
-        agents = self._load_agents()
-        agent_data = agents.get(agent_id)
-        
-        if agent_data:
-            return CustomAgent(**agent_data)
-        return None
+        return self._agents().get(agent_id)
+
+    def get_agent_by_name(self, name: str) -> Optional[CustomAgent]:
+        """Get a specific agent by display name (case-insensitive)"""
+        return self._agents().get_by_name(name)
 
     def list_agents(self, public_only: bool = True, search: Optional[str] = None, limit: int = 50) -> List[CustomAgent]:
         """List all agents with optional filtering"""
-        agents = self._load_agents()
-        agent_list = []
-        
-        for agent_data in agents.values():
-            agent = CustomAgent(**agent_data)
-            
-            # Filter by public status
-            if public_only and not agent.is_public:
-                continue
-            
-            # Filter by search term
-            if search:
-                search_lower = search.lower()
-                if (search_lower not in agent.name.lower() and 
-                    search_lower not in agent.description.lower()):
-                    continue
-            
-            agent_list.append(agent)
-        
-        # Sort by usage count and rating
-        agent_list.sort(key=lambda a: (a.average_rating, a.usage_count), reverse=True)
-        
-        return agent_list[:limit]
+        agents = self._agents()
+        if not search:
+            return self.list_agents_page(public_only, limit)[0]
+
+        # Ranked full-text search over name, description and enhanced prompt. Writers update
+        # the index postings in place, so the search runs under the same lock they take.
+        with self._lock:
+            if not agents.search_ready:
+                agents.build_search_index()
+            return agents.search(search, limit, public_only)
+
+    def all_custom_agents(self) -> List[CustomAgent]:
+        """Every custom agent, public or not (catalog-wide jobs such as re-scoring)"""
+        return list(self._agents().values())
+
+    def warm_search_index(self) -> None:
+        """Build the search index up front (it is otherwise built by the first search)"""
+        with self._lock:
+            agents = self._agents()
+            if not agents.search_ready:
+                agents.build_search_index()
+
+    def list_agents_page(self, public_only: bool = True, limit: int = 50,
+                         cursor: Optional[str] = None) -> Tuple[List[CustomAgent], Optional[str]]:
+        """One page of agents by (average_rating, usage_count), plus the cursor of the next page"""
+        agents = self._agents()
+        # The store keeps a ranking index; no need to sort the whole catalog
+        keys = self.store.rank_agents(public_only, limit + 1, self._decode_cursor(cursor) if cursor else None)
+        page = [agents.get(key[2]) for key in keys[:limit] if key[2] in agents]
+        next_cursor = self._encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+        return page, next_cursor
+
+    @staticmethod
+    def _encode_cursor(key: tuple) -> str:
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            rating, usage, agent_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return (float(rating), int(usage), str(agent_id))
+        except (ValueError, TypeError, UnicodeError):
+            raise ValueError("Invalid cursor")
 
     def update_agent(self, agent_id: str, request: AgentUpdateRequest, 
                     enhanced_prompt: Optional[str] = None, 
                     system_prompt: Optional[str] = None) -> Optional[CustomAgent]:
         """Update an existing agent"""
-        agents = self._load_agents()
+        with self._lock:
+            # Name check and save in one locked section, as in create_agent
+            agents = self._agents()
         
-        if agent_id not in agents:
-            return None
+            if agent_id not in agents:
+                return None
         
-        agent_data = agents[agent_id]
+            agent_data = agents.get(agent_id).dict()
         
-        # Update fields if provided
-        if request.name is not None:
-            # Check for duplicate names (excluding current agent)
-            for aid, existing_agent in agents.items():
-                if (aid != agent_id and 
-                    existing_agent.get('name', '').lower() == request.name.lower()):
+            # Update fields if provided
+            if request.name is not None:
+                # Check for duplicate names (excluding current agent)
+                existing_agent = agents.get_by_name(request.name)
+                if existing_agent is not None and existing_agent.id != agent_id:
                     raise ValueError(f"Agent with name '{request.name}' already exists")
-            agent_data['name'] = request.name
+                agent_data['name'] = request.name
         
-        if request.avatar is not None:
-            agent_data['avatar'] = request.avatar
+            if request.avatar is not None:
+                agent_data['avatar'] = request.avatar
         
-        if request.description is not None:
-            agent_data['description'] = request.description
+            if request.description is not None:
+                agent_data['description'] = request.description
         
-        if enhanced_prompt is not None:
-            agent_data['enhanced_prompt'] = enhanced_prompt
+            if enhanced_prompt is not None:
+                agent_data['enhanced_prompt'] = enhanced_prompt
         
-        if system_prompt is not None:
-            agent_data['system_prompt'] = system_prompt
+            if system_prompt is not None:
+                agent_data['system_prompt'] = system_prompt
         
-        # Save updated agents
-        self._save_agents(agents)
+            # Save updated agents
+            agent = CustomAgent(**agent_data)
+            self._save(agent)
         
-        return CustomAgent(**agent_data)
+            return agent
 
     def delete_agent(self, agent_id: str) -> bool:
         """Delete an agent"""
-        agents = self._load_agents()
-        
-        if agent_id in agents:
-            del agents[agent_id]
-            self._save_agents(agents)
-            
-            # Also delete associated ratings
-            ratings = self._load_ratings()
-            ratings = {rid: rating for rid, rating in ratings.items() 
-                      if rating.get('agent_id') != agent_id}
-            self._save_ratings(ratings)
+        agents = self._agents()
+        with self._lock:
+            if agents.remove(agent_id) is None:
+                return False
+            self._pending_usage.pop(agent_id, None)
+            # Also deletes associated ratings
+            self.store.delete_agent(agent_id)
+            self._wrote()
+            self._definitions_version += 1
+            self._changed()
             
             return True
-        
-        return False
 
     def increment_usage(self, agent_id: str) -> None:
-        """Increment usage count for an agent"""
-        agents = self._load_agents()
+        """Increment usage count for an agent (in memory; persisted by flush_usage)"""
+        agent = self._agents().get(agent_id)
         
-        if agent_id in agents:
-            agents[agent_id]['usage_count'] = agents[agent_id].get('usage_count', 0) + 1
-            self._save_agents(agents)
+        if agent is not None:
+            with self._lock:
+                agent.usage_count += 1
+                self._pending_usage[agent_id] += 1
+
+    def flush_usage(self) -> int:
+        """Write buffered usage increments to the store; returns how many agents were updated"""
+        with self._lock:
+            if not self._pending_usage:
+                return 0
+            deltas = Counter(self._pending_usage)
+            self.store.add_usage(deltas)
+            # Cleared only once written: a failed flush keeps the increments for the next one
+            self._pending_usage = Counter()
+            self._wrote()
+            # Usage counts in listings are republished here rather than on every turn
+            self._changed()
+        return len(deltas)
 
     def add_rating(self, rating: AgentRating) -> None:
         """Add a rating for an agent"""
-        ratings = self._load_ratings()
-        ratings[rating.id] = rating.dict()
-        self._save_ratings(ratings)
-        
-        # Update agent's average rating
-        self._update_agent_rating(rating.agent_id)
-
-    def _update_agent_rating(self, agent_id: str) -> None:
-        """Recalculate and update agent's average rating"""
-        ratings = self._load_ratings()
-        agent_ratings = [AgentRating(**rating) for rating in ratings.values() 
-                        if rating.get('agent_id') == agent_id]
-        
-        if not agent_ratings:
-            return
-        
-        # Calculate average of all rating criteria
-        total_scores = []
-        for rating in agent_ratings:
-            avg_score = (rating.argument_quality + rating.consistency + 
-                        rating.engagement + rating.overall_satisfaction) / 4
-            total_scores.append(avg_score)
-        
-        average_rating = sum(total_scores) / len(total_scores)
-        rating_count = len(agent_ratings)
+        with self._lock:
+            totals = self.store.add_rating(rating.dict())
+            
+            # Update agent's average rating
+            self._update_agent_rating(totals)
+
+    def delete_rating(self, rating_id: str) -> bool:
+        """Delete a single rating"""
+        with self._lock:
+            totals = self.store.delete_rating(rating_id)
+            if totals is None:
+                return False
+            self._update_agent_rating(totals)
+            return True
+
+    def _update_agent_rating(self, totals: dict) -> None:
+        """Set the agent's average rating from its running totals (no rescan of its ratings)"""
+        summary = self._summarize(totals)
         
         # Update agent data
-        agents = self._load_agents()
-        if agent_id in agents:
-            agents[agent_id]['average_rating'] = round(average_rating, 2)
-            agents[agent_id]['rating_count'] = rating_count
-            self._save_agents(agents)
+        agent = self._agents().get(summary.agent_id)
+        if agent is not None:
+            agent.average_rating = summary.average_rating
+            agent.rating_count = summary.rating_count
+            self.store.update_agent(agent.id, {"average_rating": agent.average_rating,
+                                               "rating_count": agent.rating_count})
+            self._wrote()
+            self._changed()
+
+    @staticmethod
+    def _summarize(totals: dict) -> AgentRatingSummary:
+        count = totals["rating_count"]
+        criteria = {c: round(totals[c] / count, 2) if count else 0.0 for c in RATING_CRITERIA}
+        # Average of all rating criteria
+        overall = sum(totals[c] for c in RATING_CRITERIA) / len(RATING_CRITERIA) / count if count else 0.0
+        return AgentRatingSummary(agent_id=totals["agent_id"], rating_count=count,
+                                  average_rating=round(overall, 2), criteria=criteria)
+
+    def get_rating_summary(self, agent_id: str) -> AgentRatingSummary:
+        """Per-criterion averages for an agent, from the running totals"""
+        return self._summarize(self.store.get_rating_totals(agent_id))
 
     def get_agent_ratings(self, agent_id: str) -> List[AgentRating]:
         """Get all ratings for a specific agent"""
-        ratings = self._load_ratings()
-        return [AgentRating(**rating) for rating in ratings.values() 
-                if rating.get('agent_id') == agent_id]
+        return [AgentRating(**rating) for rating in self.store.get_ratings(agent_id)]
 
     def get_default_agents(self) -> List[Dict[str, str]]:
         """Get the default agents (Deon, Conse, Virtue) in agent format"""
@@ -253,13 +384,35 @@ class AgentService:
 
     def get_all_available_agents(self) -> List[Dict]:
         """Get all agents (default + custom) in a unified format"""
+        return self.get_all_available_agents_page()[0]
+
+    def all_agents_snapshot(self) -> Tuple[str, bytes]:
+        """ETag and pre-serialized body of the first /api/agents/all page.
+
+        Rebuilt on the first read after the catalog version moved, so a burst of writes
+        costs one rebuild and unchanged polls cost nothing but the lookup.
+        """
+        etag = self.catalog_etag
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != etag:
+            with self._lock:
+                etag = self.catalog_etag
+                agents, next_cursor = self.get_all_available_agents_page()
+                body = json.dumps({"agents": agents, "next_cursor": next_cursor},
+                                  ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                self._snapshot = snapshot = (etag, body)
+        return snapshot
+
+    def get_all_available_agents_page(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of default + custom agents; the default agents lead the first page"""
         all_agents = []
         
         # Add default agents
-        all_agents.extend(self.get_default_agents())
+        if cursor is None:
+            all_agents.extend(self.get_default_agents())
         
         # Add custom agents
-        custom_agents = self.list_agents(public_only=True)
+        custom_agents, next_cursor = self.list_agents_page(public_only=True, limit=limit, cursor=cursor)
         for agent in custom_agents:
             all_agents.append({
                 "id": agent.id,
@@ -271,4 +424,4 @@ class AgentService:
                 "usage_count": agent.usage_count
             })
         
-        return all_agents
\ No newline at end of file
+        return all_agents, next_cursor
@@ -0,0 +1,678 @@
+# backend/services/agent_store.py
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within one process
+    fcntl = None
+
+AGENT_COLUMNS = (
+    "id", "name", "avatar", "description", "enhanced_prompt", "system_prompt", "created_by",
+    "created_at", "is_public", "usage_count", "average_rating", "rating_count",
+)
+RATING_COLUMNS = (
+    "id", "agent_id", "debate_id", "user_id", "argument_quality", "consistency", "engagement",
+    "overall_satisfaction", "comment", "created_at",
+)
+RATING_CRITERIA = ("argument_quality", "consistency", "engagement", "overall_satisfaction")
+# Change feed bounds: past these, a worker that fell behind reloads everything instead
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+JOURNAL_MAX_AGENTS = 1000
+CHANGES_KEPT = 20000
+
+
+def normalize_name(name: str) -> str:
+    return name.lower().strip()
+
+
+def _rank(record: dict) -> tuple:
+    return (record.get("average_rating", 0.0), record.get("usage_count", 0), record["id"])
+
+
+def empty_totals(agent_id: str) -> dict:
+    """Running rating aggregate for one agent: count plus per-criterion sums"""
+    return {"agent_id": agent_id, "rating_count": 0, **{c: 0 for c in RATING_CRITERIA}}
+
+
+def _add_to_totals(totals: dict, rating: dict, sign: int = 1) -> dict:
+    totals["rating_count"] += sign
+    for c in RATING_CRITERIA:
+        totals[c] += sign * rating[c]
+    return totals
+
+
+class AgentStore(ABC):
+    """Persistence for custom agents and their ratings.
+
+    Records are plain dicts in CustomAgent / AgentRating shape. AgentService keeps the
+    parsed agents in memory and writes through to a store; `stamp()` tells it when another
+    writer changed the data underneath.
+    """
+
+    @abstractmethod
+    def stamp(self) -> Optional[tuple]:
+        """Version of the stored data; changes when another process writes"""
+
+    @abstractmethod
+    def own_stamp(self, known: Optional[tuple]) -> Optional[tuple]:
+        """Stamp to remember after our own write, given the one our cache was loaded at.
+
+        None means the write also picked up another process's changes, so the caller
+        has to reload.
+        """
+
+    @abstractmethod
+    def change_cursor(self) -> Optional[tuple]:
+        """Position in the change feed; read it before load_agents()"""
+
+    @abstractmethod
+    def changes_since(self, cursor: Optional[tuple]) -> Optional[Tuple[tuple, Dict[str, Optional[dict]]]]:
+        """Agents written since `cursor`: (new cursor, {id: record, or None if deleted}).
+
+        Includes our own writes. None means the feed doesn't reach back to `cursor`
+        (too old, or a bulk write), so the caller has to reload everything.
+        """
+
+    @abstractmethod
+    def load_agents(self) -> Dict[str, dict]:
+        ...
+
+    @abstractmethod
+    def save_agent(self, record: dict) -> None:
+        """Insert or replace one agent"""
+
+    @abstractmethod
+    def save_agents(self, records: List[dict]) -> None:
+        """Insert or replace several agents in one write (bulk import)"""
+
+    @abstractmethod
+    def update_agent(self, agent_id: str, fields: dict) -> None:
+        """Set some fields of an existing agent (counters, rating aggregates)"""
+
+    @abstractmethod
+    def add_usage(self, deltas: Dict[str, int]) -> None:
+        """Add buffered usage increments, one batch per flush"""
+
+    @abstractmethod
+    def delete_agent(self, agent_id: str) -> None:
+        """Delete an agent and its ratings"""
+
+    @abstractmethod
+    def rank_agents(self, public_only: bool = True, limit: int = 50,
+                    after: Optional[tuple] = None) -> List[Tuple[float, int, str]]:
+        """(average_rating, usage_count, id) of the top agents, best first, id breaking ties.
+
+        `after` is the key of the last agent on the previous page (keyset pagination).
+        """
+
+    @abstractmethod
+    def add_rating(self, record: dict) -> dict:
+        """Store a rating; returns the agent's updated rating totals"""
+
+    @abstractmethod
+    def delete_rating(self, rating_id: str) -> Optional[dict]:
+        """Remove a rating; returns the agent's updated totals, or None if there was no such rating"""
+
+    @abstractmethod
+    def get_rating_totals(self, agent_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def get_ratings(self, agent_id: str) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def import_records(self, agents: Dict[str, dict], ratings: Dict[str, dict]) -> None:
+        """Bulk load (migration, benchmarks)"""
+
+
+def _file_stamp(path: Path) -> Optional[tuple]:
+    # Files are replaced by rename, so every write also gets a new inode
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    """Write to a temp file in the same directory and rename it over `path`.
+
+    Readers see either the old file or the new one, never a partial write.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class JsonAgentStore(AgentStore):
+    """The original storage: two JSON files, each rewritten whole on every change.
+
+    Safe to share between worker processes. Writes take an advisory lock on
+    `<agents file>.lock`, re-read a file another process changed since we last read it,
+    and replace files atomically, so concurrent writers don't lose each other's updates.
+    Each agents write also appends the records it changed to `<agents file>.changes`,
+    chained by file stamp, so other workers can catch up without re-reading the file.
+    """
+
+    def __init__(self, agents_file: Path, ratings_file: Path):
+        self.agents_file = agents_file
+        self.ratings_file = ratings_file
+        self.lock_file = agents_file.with_name(agents_file.name + ".lock")
+        self.journal_file = agents_file.with_name(agents_file.name + ".changes")
+        self._thread_lock = threading.RLock()
+        self._agents: Dict[str, dict] = {}
+        self._agents_stamp: Optional[tuple] = None  # file version self._agents was read from
+        self._written: Tuple[Optional[tuple], Optional[tuple]] = (None, None)  # (before, after) our last write
+        self._totals: Optional[Dict[str, dict]] = None  # built from the ratings file on first use
+        self._ratings_stamp: Optional[tuple] = None
+
+        # Initialize files if they don't exist
+        with self._locked():
+            if not self.agents_file.exists():
+                self._save_agents({})
+            if not self.ratings_file.exists():
+                self._save_ratings({})
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive across threads (RLock) and processes (flock on the lock file)"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_file, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_agents(self) -> Dict[str, dict]:
+        """Load agents from JSON file"""
+        return self._read_json(self.agents_file)
+
+    def _save_agents(self, agents: Dict[str, dict], changed: Optional[Dict[str, Optional[dict]]] = None) -> None:
+        """Save agents to JSON file and journal `changed` (None: too much to journal)"""
+        before = _file_stamp(self.agents_file)
+        _write_json_atomic(self.agents_file, agents)
+        self._agents_stamp = _file_stamp(self.agents_file)
+        self._written = (before, self._agents_stamp)
+        self._journal(before, self._agents_stamp, changed)
+
+    def _journal(self, before: Optional[tuple], after: Optional[tuple],
+                 changed: Optional[Dict[str, Optional[dict]]]) -> None:
+        """Append one write to the change journal (call under the lock).
+
+        Not fsynced: a lost or torn entry only breaks the chain, and readers reload fully.
+        """
+        try:
+            size = self.journal_file.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if changed is None or len(changed) > JOURNAL_MAX_AGENTS:
+            # Break the chain; anyone behind this write reloads
+            if size:
+                self.journal_file.write_text("", encoding="utf-8")
+            return
+        entry = json.dumps({"from": before, "to": after, "agents": changed}, ensure_ascii=False, default=str)
+        with open(self.journal_file, "w" if size > JOURNAL_MAX_BYTES else "a", encoding="utf-8") as f:
+            f.write(entry + "\n")
+
+    def _load_ratings(self) -> Dict[str, dict]:
+        """Load ratings from JSON file"""
+        stamp = _file_stamp(self.ratings_file)
+        if stamp != self._ratings_stamp:
+            # Another process added or removed ratings; the running totals are stale
+            self._totals = None
+        ratings = self._read_json(self.ratings_file)
+        self._ratings_stamp = stamp
+        return ratings
+
+    def _save_ratings(self, ratings: Dict[str, dict]) -> None:
+        """Save ratings to JSON file"""
+        _write_json_atomic(self.ratings_file, ratings)
+        self._ratings_stamp = _file_stamp(self.ratings_file)
+
+    @staticmethod
+    def _read_json(path: Path) -> Dict[str, dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            # Writes are atomic, so this is real damage; returning {} would let the next save wipe it
+            print(f"DEBUG corrupt store file {path}: {e}")
+            raise
+
+    def _fresh_agents(self) -> Dict[str, dict]:
+        """Our copy of the agents file, re-read if another process replaced it (call under the lock)"""
+        stamp = _file_stamp(self.agents_file)
+        if stamp != self._agents_stamp:
+            self._agents = self._load_agents()
+            self._agents_stamp = stamp
+        return self._agents
+
+    def stamp(self) -> Optional[tuple]:
+        return _file_stamp(self.agents_file)
+
+    def own_stamp(self, known: Optional[tuple]) -> Optional[tuple]:
+        before, after = self._written
+        # If the file had moved past `known` when we wrote, we merged someone else's changes
+        return after if before == known else None
+
+    def change_cursor(self) -> Optional[tuple]:
+        return _file_stamp(self.agents_file)
+
+    def changes_since(self, cursor: Optional[tuple]) -> Optional[Tuple[tuple, Dict[str, Optional[dict]]]]:
+        if cursor is None:
+            return None
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        position, changes = cursor, {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # entry still being appended
+            if entry["from"] is not None and tuple(entry["from"]) == position:
+                changes.update(entry["agents"])
+                position = tuple(entry["to"])
+        if position != _file_stamp(self.agents_file):
+            return None
+        return position, changes
+
+    def load_agents(self) -> Dict[str, dict]:
+        with self._thread_lock:
+            stamp = _file_stamp(self.agents_file)
+            self._agents = self._load_agents()
+            self._agents_stamp = stamp
+            return dict(self._agents)
+
+    def save_agent(self, record: dict) -> None:
+        self.save_agents([record])
+
+    def save_agents(self, records: List[dict]) -> None:
+        with self._locked():
+            agents = self._fresh_agents()
+            for record in records:
+                agents[record["id"]] = record
+            self._save_agents(agents, {record["id"]: record for record in records})
+
+    def update_agent(self, agent_id: str, fields: dict) -> None:
+        with self._locked():
+            agents = self._fresh_agents()
+            if agent_id in agents:
+                agents[agent_id].update(fields)
+                self._save_agents(agents, {agent_id: agents[agent_id]})
+
+    def add_usage(self, deltas: Dict[str, int]) -> None:
+        with self._locked():
+            agents = self._fresh_agents()
+            changed = {}
+            for agent_id, delta in deltas.items():
+                if agent_id in agents:
+                    agents[agent_id]['usage_count'] = agents[agent_id].get('usage_count', 0) + delta
+                    changed[agent_id] = agents[agent_id]
+            self._save_agents(agents, changed)
+
+    def delete_agent(self, agent_id: str) -> None:
+        with self._locked():
+            agents = self._fresh_agents()
+            if agents.pop(agent_id, None) is not None:
+                self._save_agents(agents, {agent_id: None})
+            ratings = self._load_ratings()
+            ratings = {rid: rating for rid, rating in ratings.items()
+                       if rating.get('agent_id') != agent_id}
+            self._save_ratings(ratings)
+            if self._totals is not None:
+                self._totals.pop(agent_id, None)
+
+    def rank_agents(self, public_only: bool = True, limit: int = 50,
+                    after: Optional[tuple] = None) -> List[Tuple[float, int, str]]:
+        with self._thread_lock:
+            agents = self._fresh_agents()
+            keys = [_rank(r) for r in agents.values() if r.get("is_public", True) or not public_only]
+        if after is not None:
+            keys = [k for k in keys if k < after]
+        return heapq.nlargest(limit, keys)
+
+    def _rating_totals(self, ratings: Dict[str, dict]) -> Dict[str, dict]:
+        if self._totals is None:
+            self._totals = {}
+            for rating in ratings.values():
+                agent_id = rating["agent_id"]
+                _add_to_totals(self._totals.setdefault(agent_id, empty_totals(agent_id)), rating)
+        return self._totals
+
+    def add_rating(self, record: dict) -> dict:
+        with self._locked():
+            ratings = self._load_ratings()
+            totals = self._rating_totals(ratings)
+            ratings[record["id"]] = record
+            self._save_ratings(ratings)
+            agent_id = record["agent_id"]
+            return dict(_add_to_totals(totals.setdefault(agent_id, empty_totals(agent_id)), record))
+
+    def delete_rating(self, rating_id: str) -> Optional[dict]:
+        with self._locked():
+            ratings = self._load_ratings()
+            totals = self._rating_totals(ratings)
+            record = ratings.pop(rating_id, None)
+            if record is None:
+                return None
+            self._save_ratings(ratings)
+            agent_id = record["agent_id"]
+            return dict(_add_to_totals(totals.setdefault(agent_id, empty_totals(agent_id)), record, -1))
+
+    def get_rating_totals(self, agent_id: str) -> dict:
+        with self._thread_lock:
+            if self._totals is None or _file_stamp(self.ratings_file) != self._ratings_stamp:
+                totals = self._rating_totals(self._load_ratings())
+            else:
+                totals = self._totals
+            return dict(totals.get(agent_id) or empty_totals(agent_id))
+
+    def get_ratings(self, agent_id: str) -> List[dict]:
+        return [r for r in self._read_json(self.ratings_file).values() if r.get('agent_id') == agent_id]
+
+    def import_records(self, agents: Dict[str, dict], ratings: Dict[str, dict]) -> None:
+        with self._locked():
+            merged = self._fresh_agents()
+            merged.update(agents)
+            self._save_agents(merged)
+            existing = self._load_ratings()
+            existing.update(ratings)
+            self._save_ratings(existing)
+            self._totals = None
+
+
+class SqliteAgentStore(AgentStore):
+    """SQLite storage: single-row writes, indexed name / rating / ranking lookups.
+
+    On first open of an empty database, agents and ratings are imported once from the
+    JSON files of the old storage (if any); the files are left in place. Triggers log
+    the id of every agent written to `agent_changes`, the change feed other workers read.
+    """
+
+    def __init__(self, db_path: Path, legacy: Optional[JsonAgentStore] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)  # other workers may hold the write lock
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS agents (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                avatar TEXT NOT NULL,
+                description TEXT NOT NULL,
+                enhanced_prompt TEXT NOT NULL,
+                system_prompt TEXT NOT NULL,
+                created_by TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                is_public INTEGER NOT NULL,
+                usage_count INTEGER NOT NULL DEFAULT 0,
+                average_rating REAL NOT NULL DEFAULT 0,
+                rating_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_agents_name_key ON agents (name_key);
+            DROP INDEX IF EXISTS idx_agents_rank;
+            CREATE INDEX IF NOT EXISTS idx_agents_rank_id ON agents (average_rating DESC, usage_count DESC, id DESC);
+            CREATE TABLE IF NOT EXISTS agent_ratings (
+                id TEXT PRIMARY KEY,
+                agent_id TEXT NOT NULL,
+                debate_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                argument_quality INTEGER NOT NULL,
+                consistency INTEGER NOT NULL,
+                engagement INTEGER NOT NULL,
+                overall_satisfaction INTEGER NOT NULL,
+                comment TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ratings_agent ON agent_ratings (agent_id);
+            CREATE TABLE IF NOT EXISTS agent_rating_totals (
+                agent_id TEXT PRIMARY KEY,
+                rating_count INTEGER NOT NULL,
+                argument_quality INTEGER NOT NULL,
+                consistency INTEGER NOT NULL,
+                engagement INTEGER NOT NULL,
+                overall_satisfaction INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS agent_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, agent_id TEXT NOT NULL);
+            CREATE TRIGGER IF NOT EXISTS agents_inserted AFTER INSERT ON agents
+                BEGIN INSERT INTO agent_changes (agent_id) VALUES (NEW.id); END;
+            CREATE TRIGGER IF NOT EXISTS agents_updated AFTER UPDATE ON agents
+                BEGIN INSERT INTO agent_changes (agent_id) VALUES (NEW.id); END;
+            CREATE TRIGGER IF NOT EXISTS agents_deleted AFTER DELETE ON agents
+                BEGIN INSERT INTO agent_changes (agent_id) VALUES (OLD.id); END;
+        """)
+        self._db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS agent_changes_pruned AFTER INSERT ON agent_changes
+                WHEN NEW.seq % 1000 = 0
+                BEGIN DELETE FROM agent_changes WHERE seq <= NEW.seq - {CHANGES_KEPT}; END
+        """)
+        self._db.commit()
+        with self._lock:
+            has_totals = self._db.execute("SELECT 1 FROM agent_rating_totals LIMIT 1").fetchone()
+            has_ratings = self._db.execute("SELECT 1 FROM agent_ratings LIMIT 1").fetchone()
+        if has_ratings and not has_totals:
+            # Database from before running totals were kept
+            self._rebuild_totals()
+        if legacy is not None:
+            self.migrate(legacy)
+
+    def _rebuild_totals(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM agent_rating_totals")
+            self._db.execute(
+                f"INSERT INTO agent_rating_totals (agent_id, rating_count, {', '.join(RATING_CRITERIA)}) "
+                f"SELECT agent_id, COUNT(*), {', '.join(f'SUM({c})' for c in RATING_CRITERIA)} "
+                f"FROM agent_ratings GROUP BY agent_id"
+            )
+
+    def migrate(self, legacy: JsonAgentStore) -> int:
+        """One-shot import from the JSON files; returns the number of agents imported"""
+        with self._lock:
+            done = self._db.execute("SELECT value FROM store_meta WHERE key = 'migrated_from_json'").fetchone()
+        if done:
+            return 0
+        agents = legacy._load_agents() if legacy.agents_file.exists() else {}
+        ratings = legacy._load_ratings() if legacy.ratings_file.exists() else {}
+        self.import_records(agents, ratings)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('migrated_from_json', ?)",
+                             (str(len(agents)),))
+        if agents:
+            print(f"DEBUG migrated {len(agents)} agents and {len(ratings)} ratings from {legacy.agents_file.parent}")
+        return len(agents)
+
+    @staticmethod
+    def _agent_row(record: dict) -> tuple:
+        row = dict(record, name_key=normalize_name(record["name"]), created_at=str(record["created_at"]),
+                   is_public=int(record.get("is_public", True)))
+        return tuple(row.get(c) for c in AGENT_COLUMNS + ("name_key",))
+
+    @staticmethod
+    def _rating_row(record: dict) -> tuple:
+        return tuple(str(record[c]) if c == "created_at" else record.get(c) for c in RATING_COLUMNS)
+
+    def stamp(self) -> Optional[tuple]:
+        # data_version only moves when another connection commits
+        with self._lock:
+            return (self._db.execute("PRAGMA data_version").fetchone()[0],)
+
+    def own_stamp(self, known: Optional[tuple]) -> Optional[tuple]:
+        # Our own commits leave data_version alone, so the known stamp stays valid
+        return known
+
+    def change_cursor(self) -> Optional[tuple]:
+        with self._lock:
+            return (self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM agent_changes").fetchone()[0],)
+
+    def changes_since(self, cursor: Optional[tuple]) -> Optional[Tuple[tuple, Dict[str, Optional[dict]]]]:
+        if cursor is None:
+            return None
+        (seq,) = cursor
+        with self._lock:
+            # The cursor's own row (or seq 1 for an empty feed) proves nothing was pruned after it
+            rows = self._db.execute("SELECT seq, agent_id FROM agent_changes WHERE seq >= ? ORDER BY seq",
+                                    (seq,)).fetchall()
+            first = rows[0]["seq"] if rows else None
+            if (first != seq) if seq else (first not in (None, 1)):
+                return None
+            ids = list({row["agent_id"]: None for row in rows if row["seq"] > seq})
+            changes: Dict[str, Optional[dict]] = dict.fromkeys(ids)
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for row in self._db.execute(
+                    f"SELECT {', '.join(AGENT_COLUMNS)} FROM agents WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    changes[row["id"]] = dict(row, is_public=bool(row["is_public"]))
+        return (rows[-1]["seq"] if rows else seq,), changes
+
+    def load_agents(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(AGENT_COLUMNS)} FROM agents").fetchall()
+        return {row["id"]: dict(row, is_public=bool(row["is_public"])) for row in rows}
+
+    def save_agent(self, record: dict) -> None:
+        self.save_agents([record])
+
+    def save_agents(self, records: List[dict]) -> None:
+        columns = AGENT_COLUMNS + ("name_key",)
+        # One transaction for the whole batch
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO agents ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (self._agent_row(record) for record in records),
+            )
+
+    def update_agent(self, agent_id: str, fields: dict) -> None:
+        names = [c for c in fields if c in AGENT_COLUMNS and c != "id"]
+        if not names:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE agents SET {', '.join(f'{c} = ?' for c in names)} WHERE id = ?",
+                [fields[c] for c in names] + [agent_id],
+            )
+
+    def add_usage(self, deltas: Dict[str, int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany("UPDATE agents SET usage_count = usage_count + ? WHERE id = ?",
+                                 [(delta, agent_id) for agent_id, delta in deltas.items()])
+
+    def delete_agent(self, agent_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+            self._db.execute("DELETE FROM agent_ratings WHERE agent_id = ?", (agent_id,))
+            self._db.execute("DELETE FROM agent_rating_totals WHERE agent_id = ?", (agent_id,))
+
+    def rank_agents(self, public_only: bool = True, limit: int = 50,
+                    after: Optional[tuple] = None) -> List[Tuple[float, int, str]]:
+        conditions, params = [], []
+        if public_only:
+            conditions.append("is_public = 1")
+        if after is not None:
+            conditions.append("(average_rating, usage_count, id) < (?, ?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT average_rating, usage_count, id FROM agents {where}"
+                f"ORDER BY average_rating DESC, usage_count DESC, id DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def _totals_row(self, agent_id: str) -> dict:
+        row = self._db.execute(
+            f"SELECT agent_id, rating_count, {', '.join(RATING_CRITERIA)} FROM agent_rating_totals WHERE agent_id = ?",
+            (agent_id,),
+        ).fetchone()
+        return dict(row) if row else empty_totals(agent_id)
+
+    def add_rating(self, record: dict) -> dict:
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO agent_ratings ({', '.join(RATING_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(RATING_COLUMNS))})",
+                self._rating_row(record),
+            )
+            self._db.execute(
+                f"INSERT INTO agent_rating_totals (agent_id, rating_count, {', '.join(RATING_CRITERIA)}) "
+                f"VALUES (?, 1, {', '.join('?' * len(RATING_CRITERIA))}) "
+                f"ON CONFLICT (agent_id) DO UPDATE SET rating_count = rating_count + 1, "
+                + ", ".join(f"{c} = {c} + excluded.{c}" for c in RATING_CRITERIA),
+                [record["agent_id"]] + [record[c] for c in RATING_CRITERIA],
+            )
+            return self._totals_row(record["agent_id"])
+
+    def delete_rating(self, rating_id: str) -> Optional[dict]:
+        with self._lock, self._db:
+            row = self._db.execute(
+                f"SELECT agent_id, {', '.join(RATING_CRITERIA)} FROM agent_ratings WHERE id = ?", (rating_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM agent_ratings WHERE id = ?", (rating_id,))
+            self._db.execute(
+                f"UPDATE agent_rating_totals SET rating_count = rating_count - 1, "
+                + ", ".join(f"{c} = {c} - ?" for c in RATING_CRITERIA) + " WHERE agent_id = ?",
+                [row[c] for c in RATING_CRITERIA] + [row["agent_id"]],
+            )
+            return self._totals_row(row["agent_id"])
+
+    def get_rating_totals(self, agent_id: str) -> dict:
+        with self._lock:
+            return self._totals_row(agent_id)
+
+    def get_ratings(self, agent_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(RATING_COLUMNS)} FROM agent_ratings WHERE agent_id = ?", (agent_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_records(self, agents: Dict[str, dict], ratings: Dict[str, dict]) -> None:
+        agent_columns = AGENT_COLUMNS + ("name_key",)
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO agents ({', '.join(agent_columns)}) "
+                f"VALUES ({', '.join('?' * len(agent_columns))})",
+                (self._agent_row(r) for r in agents.values()),
+            )
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO agent_ratings ({', '.join(RATING_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(RATING_COLUMNS))})",
+                (self._rating_row(r) for r in ratings.values()),
+            )
+        self._rebuild_totals()
@@ -0,0 +1,182 @@
+# backend/services/debate_sessions.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+class DebateSession:
+    """A debate held server-side: the validated transcript plus the verdict once judged.
+
+    `lock` serializes rounds, so two concurrent /continue calls don't both answer the
+    same round.
+    """
+
+    def __init__(self, debate_id: str, transcript, verdict: Optional[dict] = None,
+                 created_at: Optional[float] = None):
+        self.id = debate_id
+        self.transcript = transcript
+        self.verdict = verdict
+        self.created_at = created_at or time.time()
+        self.touched_at = time.time()
+        self.lock = asyncio.Lock()
+
+
+class DebateSessionStore:
+    """Bounded, TTL-evicted store of debate sessions with an optional SQLite tier.
+
+    Sessions live in an in-memory LRU; every access extends the TTL. With `db_path`, the
+    dilemma and each turn are also written to SQLite as they are added (one row per turn,
+    so a round costs the same however long the debate is), and sessions evicted from
+    memory or lost in a restart are reloaded from there until they expire.
+    """
+
+    def __init__(self, make_transcript: Callable[[dict, List[dict]], object], max_sessions: int = 1000,
+                 ttl: float = 21600.0, db_path: Optional[str] = None):
+        # Builds a Transcript from stored dicts; keeps this module free of the API models
+        self.make_transcript = make_transcript
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, DebateSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.created = 0
+        self.evicted = 0
+        self.reloaded = 0
+
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS debates (
+                    id TEXT PRIMARY KEY, dilemma TEXT NOT NULL, verdict TEXT,
+                    created_at REAL NOT NULL, expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS debate_turns (
+                    debate_id TEXT NOT NULL, seq INTEGER NOT NULL, turn TEXT NOT NULL,
+                    PRIMARY KEY (debate_id, seq)
+                );
+            """)
+            self._purge_expired()
+
+    def create(self, dilemma: dict, turns: Optional[List[dict]] = None) -> DebateSession:
+        session = DebateSession(uuid.uuid4().hex, self.make_transcript(dilemma, turns or []))
+        with self._lock:
+            self._remember(session)
+            self.created += 1
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT INTO debates (id, dilemma, verdict, created_at, expires_at) VALUES (?, ?, NULL, ?, ?)",
+                        (session.id, json.dumps(dilemma, ensure_ascii=False), session.created_at,
+                         session.created_at + self.ttl),
+                    )
+                    self._insert_turns(session.id, 0, turns or [])
+        return session
+
+    def get(self, debate_id: str) -> Optional[DebateSession]:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(debate_id)
+            if session is not None:
+                if now - session.touched_at <= self.ttl:
+                    session.touched_at = now
+                    self._sessions.move_to_end(debate_id)
+                    self._touch_row(debate_id, now)
+                    return session
+                del self._sessions[debate_id]
+                self._delete_rows(debate_id)
+                return None
+            session = self._load(debate_id, now)
+            if session is not None:
+                self._remember(session)
+                self._touch_row(debate_id, now)
+                self.reloaded += 1
+            return session
+
+    def append_turns(self, session: DebateSession, turns: list) -> None:
+        """Add a round's turns (AgentTurn models) to the session"""
+        with self._lock:
+            start = len(session.transcript.turns)
+            session.transcript.turns.extend(turns)
+            if self._db is not None:
+                with self._db:
+                    self._insert_turns(session.id, start, [turn.dict() for turn in turns])
+
+    def set_verdict(self, session: DebateSession, verdict: dict) -> None:
+        with self._lock:
+            session.verdict = verdict
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("UPDATE debates SET verdict = ? WHERE id = ?",
+                                     (json.dumps(verdict, ensure_ascii=False), session.id))
+
+    def delete(self, debate_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(debate_id, None) is not None
+            if self._db is not None:
+                found = self._delete_rows(debate_id) or found
+            return found
+
+    def _remember(self, session: DebateSession) -> None:
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            # Still on disk (if persisted) until its TTL runs out
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _insert_turns(self, debate_id: str, start: int, turns: List[dict]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO debate_turns (debate_id, seq, turn) VALUES (?, ?, ?)",
+            [(debate_id, start + i, json.dumps(turn, ensure_ascii=False)) for i, turn in enumerate(turns)],
+        )
+
+    def _touch_row(self, debate_id: str, now: float) -> None:
+        if self._db is not None:
+            with self._db:
+                self._db.execute("UPDATE debates SET expires_at = ? WHERE id = ?", (now + self.ttl, debate_id))
+
+    def _load(self, debate_id: str, now: float) -> Optional[DebateSession]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT dilemma, verdict, created_at, expires_at FROM debates WHERE id = ?", (debate_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[3] < now:
+            self._delete_rows(debate_id)
+            return None
+        turns = [json.loads(t) for (t,) in self._db.execute(
+            "SELECT turn FROM debate_turns WHERE debate_id = ? ORDER BY seq", (debate_id,))]
+        return DebateSession(debate_id, self.make_transcript(json.loads(row[0]), turns),
+                             json.loads(row[1]) if row[1] else None, row[2])
+
+    def _delete_rows(self, debate_id: str) -> bool:
+        if self._db is None:
+            return False
+        with self._db:
+            deleted = self._db.execute("DELETE FROM debates WHERE id = ?", (debate_id,)).rowcount
+            self._db.execute("DELETE FROM debate_turns WHERE debate_id = ?", (debate_id,))
+        return deleted > 0
+
+    def _purge_expired(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM debate_turns WHERE debate_id IN "
+                             "(SELECT id FROM debates WHERE expires_at < ?)", (time.time(),))
+            self._db.execute("DELETE FROM debates WHERE expires_at < ?", (time.time(),))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+            "reloaded": self.reloaded,
+            "persistent": self._db is not None,
+        }
@@ -1,8 +1,71 @@
 # backend/services/enhancement_service.py
+import asyncio
+import hashlib
 import re
-from typing import Dict, List
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from models.custom_agent import EnhancementRequest
 from main import call_ollama  # Import the existing Ollama function
+from services.scheduler import Priority, SchedulerSaturated
+
+
+# Keyword tables behind the PromptAnalyzer heuristics (matched as substrings of the lowercased text)
+COMPLETENESS_ELEMENTS = {
+    "values": ("believe", "value", "prioritize", "important", "care about"),
+    "reasoning": ("because", "reason", "logic", "think", "consider"),
+    "examples": ("example", "such as", "like", "including", "for instance"),
+    "personality": ("compassionate", "logical", "firm", "gentle", "strict", "flexible"),
+    "decision_making": ("decision", "choose", "evaluate", "judge", "determine"),
+}
+VAGUE_TERMS = ("good", "bad", "important", "very", "really", "always", "never", "everything")
+SPECIFIC_TERMS = ("specific", "particular", "exactly", "precisely", "namely")
+CONTRADICTIONS = (
+    (("always", "never"), ("sometimes", "occasionally")),
+    (("strict", "rigid"), ("flexible", "adaptable")),
+    (("emotional", "feeling"), ("logical", "rational")),
+)
+REASONING_HINTS = ("reasoning", "logic")  # suggestions check for these
+
+
+# Every keyword any heuristic looks for, so each is searched for once per description
+KEYWORDS = tuple(sorted(
+    {w for words in COMPLETENESS_ELEMENTS.values() for w in words}
+    | set(VAGUE_TERMS) | set(SPECIFIC_TERMS)
+    | {w for pair in CONTRADICTIONS for group in pair for w in group}
+    | set(REASONING_HINTS)
+))
+
+
+# Feature bits of a description, lowest first: one per completeness element, two per
+# contradiction (one per side), then one for a reasoning hint
+_CONTRADICTION_SHIFT = len(COMPLETENESS_ELEMENTS)
+_REASONING_SHIFT = _CONTRADICTION_SHIFT + 2 * len(CONTRADICTIONS)
+_ELEMENT_BITS = (1 << _CONTRADICTION_SHIFT) - 1
+_REASONING_BIT = 1 << _REASONING_SHIFT
+
+
+def _keyword_features() -> Dict[str, Tuple[int, bool, bool]]:
+    """Per keyword: (feature bits it sets, is vague, is specific).
+
+    A description's features are the OR of its keywords' bits.
+    """
+    features = {}
+    for word in KEYWORDS:
+        bits = 0
+        for i, words in enumerate(COMPLETENESS_ELEMENTS.values()):
+            bits |= (word in words) << i
+        for i, pair in enumerate(CONTRADICTIONS):
+            for side, group in enumerate(pair):
+                bits |= (word in group) << (_CONTRADICTION_SHIFT + 2 * i + side)
+        bits |= (word in REASONING_HINTS) << _REASONING_SHIFT
+        features[word] = (bits, word in VAGUE_TERMS, word in SPECIFIC_TERMS)
+    return features
+
+
+_FEATURES = _keyword_features()
 
 
 class PromptAnalyzer:
@@ -10,96 +73,75 @@ class PromptAnalyzer:
     
     def analyze_description(self, description: str) -> Dict[str, float]:
         """Analyze description and return quality scores"""
-        scores = {
-            "clarity": self._score_clarity(description),
-            "completeness": self._score_completeness(description),
-            "specificity": self._score_specificity(description),
-            "consistency": self._score_consistency(description)
-        }
-        return scores
-    
-    def _score_clarity(self, description: str) -> float:
-        """Score clarity based on sentence structure and readability"""
-        sentences = description.split('.')
-        avg_sentence_length = sum(len(s.split()) for s in sentences) / max(len(sentences), 1)
-        
-        # Optimal sentence length is 15-20 words
-        if 10 <= avg_sentence_length <= 25:
-            clarity_score = 10.0
-        else:
-            clarity_score = max(0, 10 - abs(avg_sentence_length - 17.5) * 0.3)
-        
-        return min(10.0, clarity_score)
-    
-    def _score_completeness(self, description: str) -> float:
-        """Score completeness based on presence of key elements"""
-        description_lower = description.lower()
-        
-        # Key elements to look for
-        elements = {
-            "values": any(word in description_lower for word in 
-                         ["believe", "value", "prioritize", "important", "care about"]),
-            "reasoning": any(word in description_lower for word in 
-                           ["because", "reason", "logic", "think", "consider"]),
-            "examples": any(word in description_lower for word in 
-                          ["example", "such as", "like", "including", "for instance"]),
-            "personality": any(word in description_lower for word in 
-                             ["compassionate", "logical", "firm", "gentle", "strict", "flexible"]),
-            "decision_making": any(word in description_lower for word in 
-                                 ["decision", "choose", "evaluate", "judge", "determine"])
-        }
-        
-        present_elements = sum(elements.values())
-        completeness_score = (present_elements / len(elements)) * 10
-        
-        return completeness_score
-    
-    def _score_specificity(self, description: str) -> float:
-        """Score specificity based on concrete details vs vague terms"""
+        return self._scores(self._features(description))
+
+    def analyze_batch(self, descriptions: List[str]) -> List[Tuple[Dict[str, float], List[str]]]:
+        """(scores, suggestions) per description, equal to analyze_description + generate_suggestions.
+
+        Scores and suggestions share one feature pass per description.
+        """
+        return [self._analyze_one(description) for description in descriptions]
+
+    def _analyze_one(self, description: str) -> Tuple[Dict[str, float], List[str]]:
+        features = self._features(description)
+        scores = self._scores(features)
+        bits, _, _, word_count, _ = features
+        return scores, self._suggestions(scores, not bits & _REASONING_BIT, word_count)
+
+    @staticmethod
+    def _features(description: str) -> Tuple[int, int, int, int, float]:
+        """(feature bits, vague term count, specific term count, word count, average sentence length).
+
+        The description is lowercased and split once and every keyword is searched for once;
+        only vague and specific terms that occur are counted.
+        """
         description_lower = description.lower()
-        
-        # Vague terms that reduce specificity
-        vague_terms = ["good", "bad", "important", "very", "really", "always", "never", "everything"]
-        vague_count = sum(description_lower.count(term) for term in vague_terms)
-        
-        # Specific terms that increase specificity
-        specific_indicators = ["specific", "particular", "exactly", "precisely", "namely"]
-        specific_count = sum(description_lower.count(term) for term in specific_indicators)
-        
-        # Calculate specificity score
+        bits = vague_count = specific_count = 0
+        for word in [w for w in KEYWORDS if w in description_lower]:
+            word_bits, vague, specific = _FEATURES[word]
+            bits |= word_bits
+            if vague or specific:
+                n = description_lower.count(word)
+                vague_count += n if vague else 0
+                specific_count += n if specific else 0
         word_count = len(description.split())
+        # Sentences are split on '.', so there is one more sentence than there are periods
+        avg_sentence_length = len(description.replace('.', ' ').split()) / (description.count('.') + 1)
+        return bits, vague_count, specific_count, word_count, avg_sentence_length
+
+    @staticmethod
+    def _scores(features: Tuple[int, int, int, int, float]) -> Dict[str, float]:
+        bits, vague_count, specific_count, word_count, avg_sentence_length = features
+
+        # Clarity: optimal sentence length is 15-20 words
+        if 10 <= avg_sentence_length <= 25:
+            clarity = 10.0
+        else:
+            clarity = min(10.0, max(0, 10 - abs(avg_sentence_length - 17.5) * 0.3))
+
+        # Completeness: share of the key elements present
+        present = bin(bits & _ELEMENT_BITS).count("1")
+        completeness = (present / len(COMPLETENESS_ELEMENTS)) * 10
+
+        # Specificity: concrete terms raise it, vague terms lower it
         vague_ratio = vague_count / max(word_count, 1)
         specific_ratio = specific_count / max(word_count, 1)
-        
-        specificity_score = max(0, 10 - (vague_ratio * 20) + (specific_ratio * 10))
-        
-        return min(10.0, specificity_score)
-    
-    def _score_consistency(self, description: str) -> float:
-        """Score consistency based on coherent theme and no contradictions"""
-        # Simple consistency check - look for contradictory terms
-        description_lower = description.lower()
-        
-        contradictions = [
-            (["always", "never"], ["sometimes", "occasionally"]),
-            (["strict", "rigid"], ["flexible", "adaptable"]),
-            (["emotional", "feeling"], ["logical", "rational"])
-        ]
-        
-        contradiction_count = 0
-        for group1, group2 in contradictions:
-            has_group1 = any(term in description_lower for term in group1)
-            has_group2 = any(term in description_lower for term in group2)
-            if has_group1 and has_group2:
-                contradiction_count += 1
-        
-        # Start with high consistency, reduce for contradictions
-        consistency_score = max(0, 10 - (contradiction_count * 2))
-        
-        return consistency_score
+        specificity = min(10.0, max(0, 10 - (vague_ratio * 20) + (specific_ratio * 10)))
+
+        # Consistency: start high, lose 2 per contradiction with both sides present
+        contradiction_count = sum((bits >> (_CONTRADICTION_SHIFT + 2 * i)) & 3 == 3
+                                  for i in range(len(CONTRADICTIONS)))
+        consistency = max(0, 10 - (contradiction_count * 2))
+
+        return {"clarity": clarity, "completeness": completeness, "specificity": specificity,
+                "consistency": consistency}
     
     def generate_suggestions(self, description: str, scores: Dict[str, float]) -> List[str]:
         """Generate improvement suggestions based on analysis"""
+        bits, _, _, word_count, _ = self._features(description)
+        return self._suggestions(scores, not bits & _REASONING_BIT, word_count)
+
+    def _suggestions(self, scores: Dict[str, float], no_reasoning: bool, word_count: int) -> List[str]:
         suggestions = []
         
         if scores["completeness"] < 6:
@@ -119,11 +161,10 @@ class PromptAnalyzer:
             suggestions.append("Ensure the agent's values and reasoning style align consistently")
         
         # General suggestions
-        description_lower = description.lower()
-        if "reasoning" not in description_lower and "logic" not in description_lower:
+        if no_reasoning:
             suggestions.append("Describe whether this agent uses logical, emotional, or rule-based reasoning")
         
-        if len(description.split()) < 30:
+        if word_count < 30:
             suggestions.append("Consider expanding the description with more details about the agent's personality")
         
         return suggestions
@@ -147,8 +188,13 @@ class PromptEnhancer:
         "\n\nReturn only the enhanced system prompt, nothing else."
     )
     
-    def enhance_description(self, description: str) -> EnhancementRequest:
+    async def enhance_description(self, description: str, use_cache: Optional[bool] = None) -> EnhancementRequest:
         """Enhance a user description into a better system prompt"""
+        return (await self.enhance(description, use_cache))[0]
+
+    async def enhance(self, description: str,
+                      use_cache: Optional[bool] = None) -> Tuple[EnhancementRequest, bool]:
+        """enhance_description plus whether the model produced it (False: fallback text)"""
         analyzer = PromptAnalyzer()
         
         # Analyze original description
@@ -165,11 +211,13 @@ class PromptEnhancer:
         
         try:
             # Use existing Ollama integration to enhance
-            enhanced_prompt = call_ollama(
+            enhanced_prompt = await call_ollama(
                 self.ENHANCER_SYSTEM_PROMPT,
                 enhancement_prompt,
                 num_predict=400,
-                temp=0.7
+                temp=0.7,
+                use_cache=use_cache,
+                priority=Priority.BACKGROUND
             )
             
             # Clean up the response
@@ -188,11 +236,14 @@ class PromptEnhancer:
                 improvements_made=improvements,
                 analysis_scores=scores,
                 suggestions=suggestions
-            )
+            ), True
             
+        except SchedulerSaturated:
+            # Let admission control reach the client instead of silently degrading
+            raise
         except Exception as e:
             # Fallback enhancement if AI fails
-            return self._fallback_enhancement(description, scores, suggestions)
+            return self._fallback_enhancement(description, scores, suggestions), False
     
     def _identify_improvements(self, original: str, enhanced: str) -> List[str]:
         """Identify what improvements were made"""
@@ -247,16 +298,108 @@ class PromptEnhancer:
         )
 
 
+def normalize_description(description: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a description, for cache keys"""
+    return " ".join(unicodedata.normalize("NFKC", description).lower().split())
+
+
+class EnhancementCache:
+    """Bounded LRU of enhancement results (prompt, analysis scores, suggestions) with TTL.
+
+    Keyed by a hash of the normalized description, so re-submitting the same text, or
+    the same text with different spacing or capitalization, never reaches the model.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, EnhancementRequest]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0  # requests that waited on an identical enhancement already running
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(description: str) -> str:
+        return hashlib.sha256(normalize_description(description).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[EnhancementRequest]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: EnhancementRequest) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "joined": self.joined,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
 class EnhancementService:
     """Main service for handling agent enhancement requests"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[EnhancementCache] = None):
         self.analyzer = PromptAnalyzer()
         self.enhancer = PromptEnhancer()
+        self.cache = cache if cache is not None else EnhancementCache()
+        self._inflight: Dict[str, asyncio.Future] = {}
     
-    def enhance_agent_description(self, description: str) -> EnhancementRequest:
-        """Main method to enhance an agent description"""
-        return self.enhancer.enhance_description(description)
+    async def enhance_agent_description(self, description: str, force: bool = False) -> EnhancementRequest:
+        """Main method to enhance an agent description.
+
+        Results are cached by normalized description and identical concurrent requests share
+        one model call. `force` skips both caches and replaces the cached result.
+        """
+        key = self.cache.make_key(description)
+        if not force:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached.copy(update={"original_description": description}, deep=True)
+            running = self._inflight.get(key)
+            if running is not None:
+                self.cache.joined += 1
+                result = await asyncio.shield(running)
+                return result.copy(update={"original_description": description}, deep=True)
+
+        task = asyncio.ensure_future(self._enhance_and_store(key, description, force))
+        if not force:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded: a client that disconnects doesn't cancel the call others are waiting on
+        return await asyncio.shield(task)
+
+    async def _enhance_and_store(self, key: str, description: str, force: bool) -> EnhancementRequest:
+        result, generated = await self.enhancer.enhance(description, use_cache=False if force else None)
+        # Fallback text is not cached, so the next attempt tries the model again
+        if generated:
+            self.cache.set(key, result)
+        return result
     
     def analyze_only(self, description: str) -> Dict:
         """Analyze description without enhancement"""
@@ -269,6 +412,14 @@ class EnhancementService:
             "overall_score": sum(scores.values()) / len(scores)
         }
     
+    def analyze_batch(self, descriptions: List[str]) -> List[Dict]:
+        """analyze_only for many descriptions at once"""
+        return [
+            {"analysis_scores": scores, "suggestions": suggestions,
+             "overall_score": sum(scores.values()) / len(scores)}
+            for scores, suggestions in self.analyzer.analyze_batch(descriptions)
+        ]
+    
     def generate_system_prompt(self, enhanced_prompt: str, agent_name: str) -> str:
         """Convert enhanced prompt into final system prompt format"""
         # Clean the enhanced prompt to remove any name changes
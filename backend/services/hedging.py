@@ -0,0 +1,111 @@
+# backend/services/hedging.py
+import asyncio
+from typing import Awaitable, Callable, Optional, Tuple
+
+from services.scheduler import ModelScheduler
+
+
+class HedgePolicy:
+    """Decides when a slow turn gets a speculative backup request.
+
+    A backup is started once the first attempt has run longer than the given percentile
+    of observed upstream latency. Backups are capped at `budget` times the number of
+    primary attempts (at most 1.0, so hedging never more than doubles load) and are not
+    started while calls are queueing at the scheduler.
+    """
+
+    def __init__(self, scheduler: ModelScheduler, percentile: float = 90.0,
+                 budget: float = 0.2, min_samples: int = 20):
+        self.scheduler = scheduler
+        self.percentile = percentile
+        self.budget = min(max(budget, 0.0), 1.0)
+        self.min_samples = min_samples
+        self.primaries = 0
+        self.hedges = 0
+        self.backup_wins = 0
+        self.primary_wins = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while latency data is too thin"""
+        if self.budget <= 0 or len(self.scheduler.latency) < self.min_samples:
+            return None
+        return self.scheduler.latency.percentile(self.percentile)
+
+    def allow(self) -> bool:
+        if self.scheduler.queued() > 0:
+            return False
+        return self.hedges + 1 <= self.budget * self.primaries
+
+    def stats(self) -> dict:
+        return {
+            "primaries": self.primaries,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.primaries, 4) if self.primaries else 0.0,
+            "primary_wins": self.primary_wins,
+            "backup_wins": self.backup_wins,
+            "delay_s": self.delay(),
+        }
+
+
+async def hedged_retry(policy: Optional[HedgePolicy],
+                       primary: Callable[[], Awaitable[dict]],
+                       backup: Callable[[], Awaitable[dict]],
+                       is_valid: Callable[[dict], bool],
+                       usable: Optional[Callable[[dict], bool]] = None) -> Tuple[dict, bool]:
+    """Run `primary`, falling back to `backup` when its result is not valid.
+
+    Without a policy (or before it has latency data) this is the plain sequential retry.
+    With one, a primary still running after the hedge delay gets `backup` started
+    alongside it; the first valid result wins and the other call is cancelled.
+    If neither is valid, the backup is kept when `usable` accepts it, else the primary.
+    Returns the chosen result and whether the backup was run.
+    """
+    usable = usable or is_valid
+    delay = policy.delay() if policy else None
+    if policy:
+        policy.primaries += 1
+
+    first = asyncio.ensure_future(primary())
+    if delay is not None:
+        try:
+            await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+
+    if delay is None or first.done() or not policy.allow():
+        j = await first
+        if is_valid(j):
+            return j, False
+        j2 = await backup()
+        return (j2 if usable(j2) else j), True
+
+    policy.hedges += 1
+    second = asyncio.ensure_future(backup())
+    pending = {first, second}
+    results = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    continue
+                results[task] = task.result()
+                if is_valid(results[task]):
+                    if task is first:
+                        policy.primary_wins += 1
+                    else:
+                        policy.backup_wins += 1
+                    return results[task], True
+    finally:
+        # Cancel the loser (or both, if we were cancelled ourselves)
+        for task in pending:
+            task.cancel()
+
+    if second in results and usable(results[second]):
+        policy.backup_wins += 1
+        return results[second], True
+    if first in results:
+        return results[first], True
+    # Both attempts failed: surface the primary's error like the sequential path would
+    return await first, True
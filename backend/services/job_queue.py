@@ -0,0 +1,341 @@
+# backend/services/job_queue.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from services.scheduler import SchedulerSaturated
+
+TERMINAL = ("succeeded", "failed")
+# Failures a later attempt may get past: admission control and timeouts
+RETRYABLE = (SchedulerSaturated, asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)
+# How often a job running in another worker is re-read while someone waits on it
+REMOTE_POLL_INTERVAL = 0.5
+JOB_COLUMNS = ("id", "kind", "idempotency_key", "fingerprint", "status", "stage", "result", "error",
+               "error_status", "events", "created_at", "updated_at")
+
+
+class Job:
+    """One background task: status, progress stages and the final result or error.
+
+    A job read back from the shared database (`remote`) runs in another worker; waiting
+    on it polls the database instead of an in-process event.
+    """
+
+    def __init__(self, kind: str, fn: Callable[["Job"], Awaitable[Any]],
+                 idempotency_key: Optional[str] = None, fingerprint: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.idempotency_key = idempotency_key
+        self.fingerprint = fingerprint
+        self.status = "queued"
+        self.stage = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None  # HTTP status of the error, if it carried one
+        self.exception: Optional[Exception] = None  # for callers that waited in-request (local jobs only)
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events: List[Dict[str, Any]] = [{"stage": "queued", "at": self.created_at}]
+        self._changed = asyncio.Event()
+        self._on_change: Optional[Callable[["Job"], None]] = None  # persists local jobs
+        self._reload: Optional[Callable[["Job"], Awaitable[None]]] = None  # refreshes remote jobs
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL
+
+    @property
+    def remote(self) -> bool:
+        return self._reload is not None
+
+    def progress(self, stage: str, **data) -> None:
+        """Record a progress stage; wakes anyone streaming this job"""
+        self.stage = stage
+        self.updated_at = time.time()
+        self.events.append({"stage": stage, "at": self.updated_at, **data})
+        if self._on_change is not None:
+            self._on_change(self)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, seen: int, timeout: Optional[float] = None) -> None:
+        """Return once there are more than `seen` events (or the timeout passed)"""
+        if len(self.events) > seen:
+            return
+        if self._reload is not None:
+            loop = asyncio.get_running_loop()
+            deadline = None if timeout is None else loop.time() + timeout
+            while len(self.events) <= seen and (deadline is None or loop.time() < deadline):
+                await asyncio.sleep(REMOTE_POLL_INTERVAL)
+                await self._reload(self)
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    """Bounded queue of background jobs served by a fixed pool of asyncio workers.
+
+    Submissions carrying an idempotency key attach to the job already created under that
+    key, so a client retrying a timed-out request doesn't start the work twice. A job that
+    fails with a RETRYABLE error gives its key up, so the retry starts a new job instead of
+    getting the same 429 back. Finished jobs stay pollable for `ttl` seconds; at most
+    `max_jobs` are remembered.
+
+    With `db_path`, every job's state is also written to SQLite and keys are claimed there
+    (a UNIQUE column), so uvicorn workers sharing the file see each other's jobs: a poll
+    landing on another worker finds the job, and a key can't start two jobs. Writes go
+    through one background thread, in order, so the event loop never waits on a commit.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 100, ttl: float = 3600.0, max_jobs: int = 1000,
+                 db_path: Optional[str] = None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.attached = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)  # other workers may hold the write lock
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, kind TEXT NOT NULL, idempotency_key TEXT UNIQUE, fingerprint TEXT,
+                    status TEXT NOT NULL, stage TEXT NOT NULL, result TEXT, error TEXT, error_status INTEGER,
+                    events TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+            """)
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-db")
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            # Let the last state writes land
+            await asyncio.get_running_loop().run_in_executor(self._writer, lambda: None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job of this worker, or (with a database) one another worker is running or ran.
+
+        Reads SQLite for jobs that aren't ours; call it off the event loop.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None or self._db is None:
+            return job
+        with self._db_lock:
+            row = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ? AND updated_at >= ?",
+                                   (job_id, time.time() - self.ttl)).fetchone()
+        return self._remote(row) if row else None
+
+    async def submit(self, kind: str, fn: Callable[[Job], Awaitable[Any]], idempotency_key: Optional[str] = None,
+                     fingerprint: Optional[str] = None) -> Tuple[Job, bool]:
+        """Queue `fn(job)`; returns (job, created). created is False for an idempotent retry."""
+        self._prune()
+        if idempotency_key:
+            existing = self._jobs.get(self._by_key.get(idempotency_key, ""))
+            if existing is not None:
+                self.attached += 1
+                return existing, False
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        self._check_capacity()
+
+        job = Job(kind, fn, idempotency_key, fingerprint)
+        if self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self._writer, self._claim, job)
+            if row is not None:
+                # Another worker holds the key
+                self.attached += 1
+                return self._remote(row), False
+            try:
+                self._check_capacity()  # the queue may have filled while we waited
+            except SchedulerSaturated:
+                self._persist(job, delete=True)
+                raise
+            job._on_change = self._persist
+        self._jobs[job.id] = job
+        if idempotency_key:
+            self._by_key[idempotency_key] = job.id
+        self._queue.put_nowait(job)
+        return job, True
+
+    def _check_capacity(self) -> None:
+        if self._queue.full():
+            # Same admission-control response as a saturated model scheduler
+            raise SchedulerSaturated("Too many background jobs queued", 503, retry_after=5)
+
+    # -- SQLite tier (only with db_path) --
+
+    @staticmethod
+    def _row(job: Job) -> tuple:
+        return (job.id, job.kind, job.idempotency_key, job.fingerprint, job.status, job.stage,
+                json.dumps(job.result, ensure_ascii=False, default=str), job.error, job.error_status,
+                json.dumps(job.events, ensure_ascii=False, default=str), job.created_at, job.updated_at)
+
+    def _claim(self, job: Job) -> Optional[sqlite3.Row]:
+        """Insert the job; if its key is already taken, return that job's row instead (writer thread)"""
+        now = time.time()
+        with self._db_lock:
+            for _ in range(2):
+                try:
+                    with self._db:
+                        # Expired jobs give their keys up
+                        self._db.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+                        if job.idempotency_key:
+                            row = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE idempotency_key = ?",
+                                                   (job.idempotency_key,)).fetchone()
+                            if row is not None:
+                                return row
+                        self._db.execute(f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) "
+                                         f"VALUES ({', '.join('?' * len(JOB_COLUMNS))})", self._row(job))
+                        return None
+                except sqlite3.IntegrityError:
+                    continue  # another worker claimed the key between our read and insert; read theirs
+        raise RuntimeError("Could not claim idempotency key")
+
+    def _persist(self, job: Job, release_key: bool = False, delete: bool = False) -> None:
+        """Queue a write of the job's current state (in order, on the writer thread)"""
+        row = self._row(job)
+
+        def write() -> None:
+            with self._db_lock, self._db:
+                if delete:
+                    self._db.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+                    return
+                self._db.execute("UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, error_status = ?, "
+                                 "events = ?, updated_at = ? WHERE id = ?",
+                                 (row[4], row[5], row[6], row[7], row[8], row[9], row[11], job.id))
+                if release_key:
+                    self._db.execute("UPDATE jobs SET idempotency_key = NULL WHERE id = ?", (job.id,))
+
+        future = asyncio.get_running_loop().run_in_executor(self._writer, write)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception() is None
+                                 or print(f"DEBUG job {job.id} state write failed: {f.exception()}"))
+
+    def _remote(self, row: sqlite3.Row) -> Job:
+        job = Job(row["kind"], None, row["idempotency_key"], row["fingerprint"])
+        job.id = row["id"]
+        job.created_at = row["created_at"]
+        self._apply(job, row)
+        job._reload = self._reload
+        return job
+
+    @staticmethod
+    def _apply(job: Job, row: sqlite3.Row) -> None:
+        job.status, job.stage = row["status"], row["stage"]
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.error, job.error_status = row["error"], row["error_status"]
+        job.events = json.loads(row["events"])
+        job.updated_at = row["updated_at"]
+
+    async def _reload(self, job: Job) -> None:
+        def read():
+            with self._db_lock:
+                return self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?",
+                                        (job.id,)).fetchone()
+
+        row = await asyncio.to_thread(read)
+        if row is not None:
+            self._apply(job, row)
+        elif not job.done:
+            # Expired, or its worker went away
+            job.status, job.error = "failed", "Job was lost"
+            job.events.append({"stage": "failed", "at": time.time()})
+
+    def _prune(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if not job.done:
+                continue  # queued and running jobs always stay pollable
+            if now - job.updated_at <= self.ttl and len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+            if job.idempotency_key and self._by_key.get(job.idempotency_key) == job_id:
+                del self._by_key[job.idempotency_key]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                job.status = "running"
+                job.progress("running")
+                job.result = await job.fn(job)
+                job.status = "succeeded"
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.status, job.error = "failed", "Server shutting down"
+                self._release_key(job)
+                job.progress("failed")
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.exception = e
+                job.error = getattr(e, "detail", None) or str(e) or type(e).__name__
+                job.error_status = getattr(e, "status_code", None)
+                self.failed += 1
+                if isinstance(e, RETRYABLE):
+                    self._release_key(job)
+            finally:
+                self._queue.task_done()
+            job.progress(job.status)
+
+    def _release_key(self, job: Job) -> None:
+        """Let the next submission with this job's key start over (the job stays pollable by id)"""
+        if job.idempotency_key and self._by_key.get(job.idempotency_key) == job.id:
+            del self._by_key[job.idempotency_key]
+        if self._db is not None and job.idempotency_key:
+            self._persist(job, release_key=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "jobs": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "attached": self.attached,
+            "persistent": self._db is not None,
+        }
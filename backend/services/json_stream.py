@@ -0,0 +1,274 @@
+# backend/services/json_stream.py
+import json
+import re
+from typing import Iterator, Optional, Tuple
+
+_OBJECT_CHARS = re.compile(r'["{}]')
+_STRING_CHARS = re.compile(r'["\\]')
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)  # rest of a string, through its closing quote
+_DECODER = json.JSONDecoder(strict=False)  # raw control characters in strings are tolerated
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonFieldStream:
+    """Incrementally decodes one top-level string field from a JSON object streamed token by token.
+
+    Models stream their turn as `{"stance":"A","argument":"..."}`; feeding each token to
+    `feed()` returns the newly decoded characters of the chosen field so the argument can be
+    shown while it is still being generated. Text before the first `{` (prose, code fences)
+    is ignored.
+    """
+
+    def __init__(self, field: str = "argument"):
+        self.field = field
+        self.value = ""
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._unicode = None      # hex digits of a pending \uXXXX escape
+        self._high_surrogate = None
+        self._buf = []            # current string contents
+        self._last_string = None  # last completed string at depth 1 (candidate key)
+        self._key = None          # key whose value comes next
+        self._capturing = False
+
+    def feed(self, text: str) -> str:
+        """Consume a chunk of model output and return newly decoded characters of the field"""
+        out = []
+        i, n = 0, len(text)
+        while i < n and not self.complete:
+            if self._in_string:
+                if self._unicode is None and not self._escape:
+                    # Copy the plain run up to the next quote or backslash in one go
+                    m = _STRING_CHARS.search(text, i)
+                    j = m.start() if m else n
+                    if j > i:
+                        self._buf.append(text[i:j])
+                        if self._capturing:
+                            out.append(text[i:j])
+                        i = j
+                        continue
+                decoded = self._string_char(text[i])
+                if decoded:
+                    self._buf.append(decoded)
+                    if self._capturing:
+                        out.append(decoded)
+                i += 1
+                continue
+            ch = text[i]
+            i += 1
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._buf = []
+                self._capturing = self._depth == 1 and self._key == self.field
+            elif ch == ":":
+                self._key = self._last_string
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+            elif ch == ",":
+                self._key = None
+                self._last_string = None
+        delta = "".join(out)
+        self.value += delta
+        return delta
+
+    def _string_char(self, ch: str) -> str:
+        """Advance string state by one character, returning its decoded form ('' if none yet)"""
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) < 4:
+                return ""
+            code = int(self._unicode, 16) if all(c in "0123456789abcdefABCDEF" for c in self._unicode) else 0xFFFD
+            self._unicode = None
+            if 0xD800 <= code < 0xDC00:
+                self._high_surrogate = code
+                return ""
+            if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            return chr(code)
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+                return ""
+            return _ESCAPES.get(ch, ch)
+        if ch == "\\":
+            self._escape = True
+            return ""
+        if ch == '"':
+            self._in_string = False
+            if self._capturing:
+                self._capturing = False
+                self.complete = True
+            elif self._depth == 1:
+                self._last_string = "".join(self._buf)
+            return ""
+        return ch
+
+
+def parse_object(candidate: str) -> Optional[dict]:
+    try:
+        obj = _DECODER.decode(candidate)
+    except json.JSONDecodeError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+class JsonObjectScanner:
+    """Single-pass scanner for balanced top-level `{...}` spans in model output.
+
+    Tracks brace depth and string/escape state, so nested objects (the judge's `scores`)
+    and braces inside strings are kept intact; prose and code fences between objects are
+    skipped. Text can be fed whole or token by token: `feed()` returns a lazy iterator of
+    `(start, end)` offsets into `text`, each yielded as soon as its closing brace arrives.
+
+    A stray `{` in prose ("Sure { here it is: {...}") would otherwise swallow every later
+    object as nested; `resync()` restarts the scan just after the start of the last span,
+    for when that span fails to parse or the input ends with it still open (`pending`).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Iterator[Tuple[int, int]]:
+        self.text += chunk
+        return self._scan()
+
+    @property
+    def pending(self) -> bool:
+        """True while a `{` is open (not yet matched)"""
+        return self._depth > 0
+
+    def resync(self) -> Iterator[Tuple[int, int]]:
+        """Scan again from the first `{` after the start of the last span"""
+        self._pos = self._start + 1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        return self._scan()
+
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        text = self.text
+        i, n = self._pos, len(text)
+        while i < n:
+            if self._escape:
+                # The character after a backslash inside a string is never special
+                self._escape = False
+                i += 1
+            elif self._depth == 0:
+                i = text.find("{", i)
+                if i < 0:
+                    i = n
+                    break
+                self._depth = 1
+                self._start = i
+                i += 1
+            elif self._in_string:
+                m = _STRING_CHARS.search(text, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.end()
+                if m.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+            else:
+                m = _OBJECT_CHARS.search(text, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.end()
+                ch = m.group()
+                if ch == '"':
+                    # Skip a whole string at once when its closing quote has already arrived
+                    rest = _STRING_REST.match(text, i)
+                    if rest is None:
+                        self._in_string = True
+                    else:
+                        i = rest.end()
+                elif ch == "{":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pos = i
+                        yield self._start, i
+        self._pos = i
+
+
+def iter_objects(scanner: JsonObjectScanner, chunk: str, final: bool = False) -> Iterator[Tuple[int, dict]]:
+    """Feed `chunk` and yield (end offset, object) for each top-level span that parses.
+
+    A span that fails to parse is rescanned from its next `{`, so objects it swallowed are
+    still found; with `final` (no more input coming) so is a `{` left open at the end.
+    """
+    spans = scanner.feed(chunk)
+    while True:
+        failed = False
+        for start, end in spans:
+            obj = parse_object(scanner.text[start:end])
+            if obj is None:
+                failed = True
+                break
+            yield end, obj
+        if not failed and not (final and scanner.pending):
+            return
+        spans = scanner.resync()
+
+
+def first_object(scanner: JsonObjectScanner, chunk: str, required=()) -> Tuple[Optional[dict], Optional[dict]]:
+    """Feed the whole remaining output and return (first object with every `required` key, first object seen)"""
+    first = None
+    for _, obj in iter_objects(scanner, chunk, final=True):
+        if all(k in obj for k in required):
+            return obj, first or obj
+        if first is None:
+            first = obj
+    return None, first
+
+
+class JsonObjectTracker:
+    """Watches streamed model output for the first complete top-level JSON object.
+
+    Built on JsonObjectScanner, so braces inside strings don't count. Once an object closes,
+    it is parsed and accepted if it holds every key in `required`; `end` is then the offset
+    just past its closing brace and anything the model writes afterwards can be discarded
+    (and its generation cancelled).
+    """
+
+    def __init__(self, required=()):
+        self.required = tuple(required)
+        self.end: Optional[int] = None
+        self._scanner = JsonObjectScanner()
+
+    @property
+    def text(self) -> str:
+        return self._scanner.text
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; returns True once a complete object with the required keys was seen"""
+        if self.end is not None:
+            return True
+        for end, obj in iter_objects(self._scanner, chunk):
+            if all(k in obj for k in self.required):
+                self.end = end
+                return True
+        return False
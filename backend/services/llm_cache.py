@@ -0,0 +1,123 @@
+# backend/services/llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class LLMCache:
+    """Content-addressed cache for model responses.
+
+    Entries are keyed by a hash of model, system prompt, user prompt and sampling options.
+    An in-memory LRU with TTL sits in front of an optional SQLite tier so cached answers
+    survive restarts. Low-temperature (near-deterministic) calls such as the judge are kept
+    longer than creative ones.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0,
+                 deterministic_ttl: float = 86400.0, deterministic_temp: float = 0.3,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.deterministic_ttl = deterministic_ttl
+        self.deterministic_temp = deterministic_temp
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def persistent(self) -> bool:
+        """True when lookups and stores also hit SQLite (blocking I/O)"""
+        return self._db is not None
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str, options: dict,
+                 output_format: Optional[dict] = None) -> str:
+        material = json.dumps(
+            {"model": model, "system": system_prompt, "prompt": user_prompt, "options": options,
+             "format": output_format},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] >= now:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, temp: float) -> None:
+        if not self.enabled or not value:
+            return
+        ttl = self.deterministic_ttl if temp <= self.deterministic_temp else self.ttl
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
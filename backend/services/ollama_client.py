@@ -0,0 +1,348 @@
+# backend/services/ollama_client.py
+import asyncio
+import hashlib
+import json
+from contextlib import aclosing, nullcontext
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+from services.json_stream import JsonObjectTracker
+from services.llm_cache import LLMCache
+from services.scheduler import ModelScheduler, Priority
+
+# Per-request switch for the response cache (set from the incoming HTTP request)
+use_llm_cache: ContextVar[bool] = ContextVar("use_llm_cache", default=True)
+
+
+class OllamaClient:
+    """Shared async client for the Ollama generate API.
+
+    A single pooled httpx.AsyncClient is reused for every call so agent turns,
+    retries, judge calls and prompt enhancement all share keep-alive connections
+    instead of paying TCP/TLS setup each time. Identical generations that are
+    already in flight are coalesced onto one upstream request (single-flight).
+    """
+
+    def __init__(self, api_url: str, model: str, api_key: Optional[str] = None,
+                 connect_timeout: float = 5.0, read_timeout: float = 240.0,
+                 total_timeout: float = 240.0, max_connections: int = 32,
+                 cache: Optional[LLMCache] = None, scheduler: Optional[ModelScheduler] = None):
+        self.api_url = api_url
+        self.model = model
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_connections = max_connections
+        self.cache = cache
+        self.scheduler = scheduler
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.generate_calls = 0
+        self.coalesced_calls = 0
+        self.early_stops = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled client on first use (and again if the event loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                headers=self._headers(),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled client (called on app shutdown)"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        # Only add auth for cloud models
+        if self.model.endswith("-cloud") and self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _timeout(self, connect_timeout: Optional[float], read_timeout: Optional[float]) -> httpx.Timeout:
+        # Waiting for a pooled connection is bounded by the total timeout instead
+        return httpx.Timeout(
+            connect=connect_timeout or self.connect_timeout,
+            read=read_timeout or self.read_timeout,
+            write=connect_timeout or self.connect_timeout,
+            pool=None,
+        )
+
+    def _cache_key(self, payload: dict, system_prompt: str, user_prompt: str,
+                   use_cache: Optional[bool]) -> Optional[str]:
+        """Cache key for this call, or None when caching is off for it"""
+        if use_cache is None:
+            use_cache = use_llm_cache.get()
+        # Calls continuing a prompt context depend on it, and callers need the new context back
+        if not use_cache or self.cache is None or not self.cache.enabled or "context" in payload:
+            return None
+        return LLMCache.make_key(self.model, system_prompt, user_prompt, payload["options"], payload.get("format"))
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        # The SQLite tier reads and commits synchronously; keep it off the event loop
+        if self.cache.persistent:
+            return await asyncio.to_thread(self.cache.get, key)
+        return self.cache.get(key)
+
+    async def _cache_set(self, key: str, text: str, temp: float) -> None:
+        if self.cache.persistent:
+            await asyncio.to_thread(self.cache.set, key, text, temp)
+        else:
+            self.cache.set(key, text, temp)
+
+    def _slot(self, priority: Priority):
+        """Upstream slot from the scheduler (no-op without one)"""
+        return self.scheduler.slot(priority) if self.scheduler else nullcontext()
+
+    def _join_flight(self, flight_key: str, make_call) -> asyncio.Task:
+        """Return the in-flight task for flight_key, starting make_call() if there is none"""
+        self.generate_calls += 1
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self.coalesced_calls += 1
+            self._waiters[task] += 1
+            return task
+
+        task = asyncio.ensure_future(make_call())
+        self._inflight[flight_key] = task
+        self._waiters[task] = 1
+
+        def landed(t: asyncio.Task) -> None:
+            self._waiters.pop(t, None)
+            if self._inflight.get(flight_key) is t:
+                del self._inflight[flight_key]
+            # Mark the exception as retrieved in case every waiter was cancelled
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(landed)
+        return task
+
+    async def _wait_flight(self, task: asyncio.Task) -> dict:
+        """Wait for a shared call; the upstream request is cancelled only when every waiter has gone"""
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            remaining = self._waiters.get(task, 1) - 1
+            self._waiters[task] = remaining
+            if remaining <= 0 and not task.done():
+                task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "llm_cache": self.cache.stats() if self.cache else None,
+            "scheduler": self.scheduler.stats() if self.scheduler else None,
+            "single_flight": {
+                "calls": self.generate_calls,
+                "coalesced": self.coalesced_calls,
+                "in_flight": len(self._inflight),
+                "coalesce_rate": round(self.coalesced_calls / self.generate_calls, 4) if self.generate_calls else 0.0,
+            },
+            "early_stops": self.early_stops,
+        }
+
+    @staticmethod
+    def _flight_key(payload: dict, stop_early: bool = False) -> str:
+        # An early-stopped body has no context, so callers that need one must not join it
+        material = json.dumps([payload, stop_early], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _stops_early(early_stop: Optional[Sequence[str]], json_schema: Optional[dict],
+                     on_result: Optional[Callable[[dict], None]]) -> bool:
+        """Early stop and context capture are mutually exclusive.
+
+        Ollama only returns `context` in the final chunk of a completed generation, so a
+        caller that wants the body back (on_result) lets the model finish. Schema-constrained
+        calls already end at the closing brace and never need it.
+        """
+        return bool(early_stop) and not json_schema and on_result is None
+
+    @staticmethod
+    def _finished(body: dict, stop_early: bool) -> bool:
+        """Did the generation end normally? Only then is its text worth caching.
+
+        An early-stopped call counts only if its JSON object completed; one whose stream
+        ended without it is as incomplete as a cut-off body.
+        """
+        if stop_early:
+            return body.get("done_reason") == "early_stop"
+        return bool(body.get("done"))
+
+    def build_payload(self, system_prompt: str, user_prompt: str, num_predict: int = 400,
+                      temp: float = 0.7, top_p: float = 0.9, repeat_penalty: float = 1.1,
+                      context: Optional[List[int]] = None, json_schema: Optional[dict] = None) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": f"<|system|>\n{system_prompt}\n<|user|>\n{user_prompt}\n",
+            "options": {
+                "temperature": temp,
+                "top_p": top_p,
+                "repeat_penalty": repeat_penalty,
+                "num_predict": num_predict
+            },
+            "stream": False,
+        }
+        if json_schema:
+            # Constrain decoding to the expected JSON shape
+            payload["format"] = json_schema
+        if context:
+            # System prompt and earlier turns are already encoded in the context
+            payload["prompt"] = f"<|user|>\n{user_prompt}\n"
+            payload["context"] = context
+        return payload
+
+    async def _chunks(self, payload: dict, timeout: httpx.Timeout,
+                      deadline: Optional[float] = None) -> AsyncIterator[dict]:
+        """Stream Ollama's NDJSON chunks for a `stream: true` payload, ending after the done chunk"""
+        loop = asyncio.get_running_loop()
+        async with self._get_client().stream("POST", self.api_url, json=payload, timeout=timeout) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if deadline is not None and loop.time() > deadline:
+                    raise asyncio.TimeoutError("Ollama stream exceeded total timeout")
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                yield chunk
+                if chunk.get("done"):
+                    return
+
+    async def generate(self, system_prompt: str, user_prompt: str, num_predict: int = 400,
+                       temp: float = 0.7, top_p: float = 0.9, repeat_penalty: float = 1.1,
+                       connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                       total_timeout: Optional[float] = None, use_cache: Optional[bool] = None,
+                       priority: Priority = Priority.INTERACTIVE, context: Optional[List[int]] = None,
+                       on_result: Optional[Callable[[dict], None]] = None,
+                       json_schema: Optional[dict] = None, early_stop: Optional[Sequence[str]] = None,
+                       cache_if: Optional[Callable[[str], bool]] = None) -> str:
+        """Run a single non-streaming generation and return the response text.
+
+        Concurrent callers with the same prompt and options share one upstream request;
+        it is cancelled (freeing the model) only once every caller waiting on it is cancelled.
+        `context` continues an earlier generation; `on_result` receives Ollama's full
+        response body (new context, prompt-eval timings) when the model was actually called.
+        `json_schema` is sent as Ollama's `format` so the output must match that shape.
+
+        With `early_stop` (required keys) the call streams upstream and is cancelled as soon as
+        a complete JSON object with those keys has been written, dropping trailing prose.
+        Schema-constrained calls already end at the closing brace, and calls with `on_result`
+        need the final body's context, so both skip this (see _stops_early).
+
+        Only a generation that finished normally is cached (see _finished), and with
+        `cache_if` only text it accepts (e.g. text the caller can parse), so a truncated
+        or malformed completion is not replayed until its TTL runs out.
+        """
+        payload = self.build_payload(system_prompt, user_prompt, num_predict, temp, top_p, repeat_penalty,
+                                     context, json_schema)
+        key = self._cache_key(payload, system_prompt, user_prompt, use_cache)
+        if key:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return cached
+
+        timeout = self._timeout(connect_timeout, read_timeout)
+        stop_early = self._stops_early(early_stop, json_schema, on_result)
+
+        async def post() -> dict:
+            if stop_early:
+                return await post_until_complete()
+            r = await self._get_client().post(self.api_url, json=payload, timeout=timeout)
+            r.raise_for_status()
+            return r.json()
+
+        async def post_until_complete() -> dict:
+            tracker = JsonObjectTracker(early_stop)
+            last = {}
+            async with aclosing(self._chunks(dict(payload, stream=True), timeout)) as chunks:
+                async for chunk in chunks:
+                    last = chunk
+                    if tracker.feed(chunk.get("response", "")):
+                        self.early_stops += 1
+                        return {"response": tracker.text[:tracker.end], "done_reason": "early_stop"}
+            return dict(last, response=tracker.text)
+
+        async def scheduled_post() -> dict:
+            async with self._slot(priority):
+                return await asyncio.wait_for(post(), timeout=total_timeout or self.total_timeout)
+
+        task = self._join_flight(self._flight_key(payload, stop_early), scheduled_post)
+        body = await self._wait_flight(task)
+        text = body.get("response", "").strip()
+        if key and self._finished(body, stop_early) and (cache_if is None or cache_if(text)):
+            await self._cache_set(key, text, temp)
+        if on_result:
+            on_result(body)
+        return text
+
+    async def stream(self, system_prompt: str, user_prompt: str, num_predict: int = 400,
+                     temp: float = 0.7, top_p: float = 0.9, repeat_penalty: float = 1.1,
+                     connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                     total_timeout: Optional[float] = None, use_cache: Optional[bool] = None,
+                     priority: Priority = Priority.INTERACTIVE, context: Optional[List[int]] = None,
+                     on_result: Optional[Callable[[dict], None]] = None,
+                     json_schema: Optional[dict] = None, early_stop: Optional[Sequence[str]] = None,
+                     cache_if: Optional[Callable[[str], bool]] = None) -> AsyncIterator[str]:
+        """Run a streaming generation, yielding response tokens as Ollama produces them.
+
+        A cache hit is yielded as a single chunk. Closing the iterator early closes the
+        upstream response, which stops the generation (and nothing is cached).
+        `context`, `on_result`, `json_schema`, `early_stop` and `cache_if` work as in
+        generate(); on_result gets the final chunk.
+        """
+        payload = self.build_payload(system_prompt, user_prompt, num_predict, temp, top_p, repeat_penalty,
+                                     context, json_schema)
+        key = self._cache_key(payload, system_prompt, user_prompt, use_cache)
+        if key:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        payload["stream"] = True
+        timeout = self._timeout(connect_timeout, read_timeout)
+        tracker = JsonObjectTracker(early_stop) if self._stops_early(early_stop, json_schema, on_result) else None
+        parts = []
+        finished = False
+
+        async with self._slot(priority):
+            deadline = asyncio.get_running_loop().time() + (total_timeout or self.total_timeout)
+            async with aclosing(self._chunks(payload, timeout, deadline)) as chunks:
+                async for chunk in chunks:
+                    token = chunk.get("response", "")
+                    if tracker and tracker.feed(token):
+                        # Object complete: emit up to its closing brace and hang up on the model
+                        token = token[:len(token) - (len(tracker.text) - tracker.end)]
+                        if token:
+                            parts.append(token)
+                            yield token
+                        self.early_stops += 1
+                        finished = True
+                        break
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        # With a tracker, only the completed object counts as finished
+                        finished = tracker is None
+                        if on_result:
+                            on_result(chunk)
+
+        text = "".join(parts).strip()
+        if key and finished and (cache_if is None or cache_if(text)):
+            await self._cache_set(key, text, temp)
@@ -0,0 +1,71 @@
+# backend/services/participant_cache.py
+import threading
+from typing import Dict, Optional
+
+from services.agent_service import AgentService
+from services.agent_store import normalize_name
+
+
+class Participant:
+    """Everything a debate turn needs to know about who is speaking"""
+
+    __slots__ = ("display_name", "system_prompt", "prompt_prefix", "agent_id")
+
+    def __init__(self, display_name: str, system_prompt: str, agent_id: Optional[str] = None):
+        self.display_name = display_name
+        self.system_prompt = system_prompt
+        self.prompt_prefix = f"You are {display_name}. "
+        self.agent_id = agent_id  # set for custom agents, whose usage is counted per turn
+
+
+class ParticipantCache:
+    """Resolved debate participants by agent id or name.
+
+    Built-in agents are registered once at startup. Custom agents are resolved through
+    AgentService on first use and kept until `definitions_version` moves (an agent was
+    created, updated, regenerated or deleted, or another process changed the store), so
+    the turns of a debate cost one dictionary hit each.
+    """
+
+    def __init__(self, agent_service: AgentService):
+        self.agent_service = agent_service
+        self._builtin: Dict[str, Participant] = {}
+        self._custom: Dict[str, Participant] = {}
+        self._version = -1
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, system_prompt: str) -> Participant:
+        participant = Participant(name, system_prompt)
+        self._builtin[normalize_name(name)] = participant
+        return participant
+
+    def resolve(self, identifier: str) -> Optional[Participant]:
+        """The built-in or custom agent with this id or name, or None if there is none"""
+        builtin = self._builtin.get(normalize_name(identifier))
+        if builtin is not None:
+            return builtin
+        version = self.agent_service.definitions_version
+        with self._lock:
+            if version != self._version:
+                self._custom.clear()
+                self._version = version
+            participant = self._custom.get(identifier)
+        if participant is not None:
+            self.hits += 1
+            return participant
+
+        self.misses += 1
+        # Transcripts carry display names, so fall back to the name index
+        agent = self.agent_service.get_agent(identifier) or self.agent_service.get_agent_by_name(identifier)
+        if agent is None:
+            return None  # not cached: the agent may be created later
+        participant = Participant(agent.name, agent.system_prompt, agent.id)
+        with self._lock:
+            if version == self._version:
+                self._custom[identifier] = participant
+        return participant
+
+    def stats(self) -> Dict[str, int]:
+        return {"builtin": len(self._builtin), "custom": len(self._custom), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,121 @@
+# backend/services/prompt_context.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class PromptContextStore:
+    """Per-debate, per-agent Ollama context handles.
+
+    `/api/generate` returns a `context` array encoding the evaluated prompt and the answer.
+    Passing it back on the agent's next turn lets Ollama reuse that prefix (system prompt,
+    dilemma, earlier turns) so only the new opponent summaries need prompt evaluation.
+    Handles are kept in a bounded LRU with TTL; a handle longer than `max_tokens` is dropped
+    so the next turn starts fresh instead of overflowing the model's context window.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, max_tokens: int = 1500):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._entries: "OrderedDict[str, Tuple[float, List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused_turns = 0
+        self.reused_tokens = 0
+        self.prompt_eval_ms_saved = 0.0
+        self.last_saved_ms = 0.0
+
+    @staticmethod
+    def make_key(debate_id: str, system_prompt: str, agent: str) -> str:
+        # Keyed by the debate itself, not its dilemma: two debates on the same dilemma
+        # must not continue from each other's turns
+        digest = hashlib.sha256(f"{debate_id}\x00{system_prompt}".encode("utf-8")).hexdigest()[:24]
+        return f"{digest}:{agent}"
+
+    def get(self, key: str) -> Optional[List[int]]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, context = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return context
+
+    def update(self, key: str, result: dict, reused_tokens: int = 0) -> float:
+        """Store the context from a finished generation; returns estimated prompt-eval ms saved"""
+        saved_ms = 0.0
+        eval_count = result.get("prompt_eval_count") or 0
+        eval_ns = result.get("prompt_eval_duration") or 0
+        if reused_tokens and eval_count:
+            # The reused prefix would have been evaluated at this turn's per-token rate
+            saved_ms = reused_tokens * (eval_ns / eval_count) / 1e6
+
+        context = result.get("context")
+        with self._lock:
+            if reused_tokens:
+                self.reused_turns += 1
+                self.reused_tokens += reused_tokens
+                self.prompt_eval_ms_saved += saved_ms
+                self.last_saved_ms = saved_ms
+            if self.max_entries <= 0:
+                return saved_ms
+            if not context or len(context) > self.max_tokens:
+                self._entries.pop(key, None)
+                return saved_ms
+            self._entries[key] = (time.time() + self.ttl, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return saved_ms
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "handles": len(self._entries),
+            "reused_turns": self.reused_turns,
+            "reused_tokens": self.reused_tokens,
+            "prompt_eval_ms_saved": round(self.prompt_eval_ms_saved, 1),
+            "avg_ms_saved_per_turn": round(self.prompt_eval_ms_saved / self.reused_turns, 1) if self.reused_turns else 0.0,
+            "last_ms_saved": round(self.last_saved_ms, 1),
+        }
+
+
+class RoundContexts:
+    """Context handles for one round of one server-held debate.
+
+    Turns continue from the handles kept after the debate's earlier rounds. The contexts
+    their generations return are only held here until the round's turns are stored
+    (`commit`), so a discarded retry attempt or a cancelled round never replaces the
+    handle of the turn the transcript actually kept.
+    """
+
+    def __init__(self, store: PromptContextStore, debate_id: str):
+        self.store = store
+        self.debate_id = debate_id
+        self._held: Dict[str, Tuple[Optional[dict], int]] = {}
+
+    def key(self, system_prompt: str, agent: str) -> str:
+        return self.store.make_key(self.debate_id, system_prompt, agent)
+
+    def get(self, key: str) -> Optional[List[int]]:
+        return self.store.get(key)
+
+    def hold(self, key: str, result: Optional[dict], reused_tokens: int = 0) -> None:
+        """Remember the final response body of the kept turn for `key`"""
+        self._held[key] = (result, reused_tokens)
+
+    def commit(self) -> float:
+        """Store the held contexts; returns estimated prompt-eval ms saved by the round.
+
+        A kept turn without a context (cache hit, no body) drops the agent's handle, since
+        the old one no longer matches the transcript.
+        """
+        saved_ms = sum(self.store.update(key, result or {}, reused) for key, (result, reused) in self._held.items())
+        self._held.clear()
+        return saved_ms
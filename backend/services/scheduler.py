@@ -0,0 +1,154 @@
+# backend/services/scheduler.py
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, Optional
+
+
+class Priority(IntEnum):
+    """Model call classes, most urgent first"""
+    INTERACTIVE = 0  # live debate turns
+    JUDGE = 1        # verdict a user is waiting on
+    RETRY = 2        # second attempt after a rejected turn
+    BACKGROUND = 3   # prompt enhancement for agent creation
+
+
+class SchedulerSaturated(Exception):
+    """Raised when a model call is refused by admission control"""
+
+    def __init__(self, detail: str, status_code: int, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Rolling window of observed upstream latencies (seconds)"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": len(self._samples),
+            "p50_s": round(p50, 3) if p50 is not None else None,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class ModelScheduler:
+    """Priority scheduler and admission control in front of the model server.
+
+    At most `max_concurrency` upstream calls run at once; the rest wait in a priority queue
+    (interactive turns, then judge, then retries, then background enhancement). Each class
+    has its own queue depth limit, and callers are refused with 429 when their class queue
+    is full or 503 when they waited longer than `max_wait`, both with a Retry-After hint.
+    """
+
+    def __init__(self, max_concurrency: int = 4, queue_limits: Optional[Dict[Priority, int]] = None,
+                 max_wait: float = 120.0):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = queue_limits or {p: 32 for p in Priority}
+        self.max_wait = max_wait
+        self.latency = LatencyTracker()
+        self._active = 0
+        self._queue = []  # heap of (priority, seq, future)
+        self._depth: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._seq = itertools.count()
+        self.rejected = 0
+        self.timed_out = 0
+
+    def queued(self) -> int:
+        return sum(self._depth.values())
+
+    def retry_after(self) -> int:
+        """Rough seconds until a new caller would get a slot"""
+        typical = self.latency.percentile(50) or 10.0
+        return max(1, math.ceil(typical * (self.queued() + 1) / self.max_concurrency))
+
+    async def acquire(self, priority: Priority) -> None:
+        if self._active < self.max_concurrency and self.queued() == 0:
+            self._active += 1
+            return
+
+        if self._depth[priority] >= self.queue_limits.get(priority, 0):
+            self.rejected += 1
+            raise SchedulerSaturated(
+                f"Model queue for {priority.name.lower()} calls is full", 429, self.retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), future))
+        self._depth[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._depth[priority] -= 1
+            self.timed_out += 1
+            raise SchedulerSaturated("Model server is saturated", 503, self.retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self._depth[priority] -= 1
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the most urgent live waiter"""
+        while self._queue:
+            priority, _, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._depth[Priority(priority)] -= 1
+            future.set_result(None)
+            return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        """Hold one upstream slot for the duration of the block, recording its latency"""
+        await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.latency.record(time.monotonic() - start)
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued(),
+            "queue_depth": {p.name.lower(): self._depth[p] for p in Priority},
+            "queue_limits": {p.name.lower(): self.queue_limits.get(p, 0) for p in Priority},
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "upstream_latency": self.latency.stats(),
+        }
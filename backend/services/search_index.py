@@ -0,0 +1,102 @@
+# backend/services/search_index.py
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or our she "
+    "that the their them they this to was we were who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking over a few weighted text fields.
+
+    Documents are added, replaced and removed one at a time, so the index follows the
+    agent catalog without rebuilds. Query terms also match indexed terms they are a prefix
+    of (at reduced weight), so partial words typed in a search box still find agents.
+    """
+
+    def __init__(self, field_weights: Dict[str, float], k1: float = 1.2, b: float = 0.75,
+                 prefix_weight: float = 0.5, max_expansions: int = 50):
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        self.prefix_weight = prefix_weight
+        self.max_expansions = max_expansions
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._total_len = 0.0
+        self._vocab: List[str] = []  # sorted, for prefix lookups
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc_id: str, fields: Dict[str, str]) -> None:
+        """Index a document, replacing any previous version"""
+        self.remove(doc_id)
+        tf: Dict[str, float] = {}
+        for name, weight in self.field_weights.items():
+            for term, count in Counter(tokenize(fields.get(name) or "")).items():
+                tf[term] = tf.get(term, 0.0) + weight * count
+        self._doc_terms[doc_id] = tf
+        length = sum(tf.values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        for term, freq in tf.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._vocab, term)
+            postings[doc_id] = freq
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocab, term)
+                del self._vocab[i]
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed terms matching a query token: itself, then terms it is a prefix of"""
+        matches = [(token, 1.0)] if token in self._postings else []
+        i = bisect.bisect_right(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token) and len(matches) < self.max_expansions:
+            matches.append((self._vocab[i], self.prefix_weight))
+            i += 1
+        return matches
+
+    def search(self, query: str, k: int = 50, accept: Optional[Callable[[str], bool]] = None,
+               tiebreak: Optional[Callable[[str], tuple]] = None) -> List[Tuple[str, float]]:
+        """Top `k` (doc_id, score) pairs for the query, best first"""
+        n = len(self._doc_terms)
+        if not n or k <= 0:
+            return []
+        avg_len = self._total_len / n or 1.0
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, freq in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * idf * freq * (self.k1 + 1) / (freq + norm)
+        candidates = scores.items() if accept is None else ((d, s) for d, s in scores.items() if accept(d))
+        if tiebreak is None:
+            return heapq.nlargest(k, candidates, key=lambda item: item[1])
+        return heapq.nlargest(k, candidates, key=lambda item: (item[1],) + tiebreak(item[0]))
@@ -0,0 +1,70 @@
+"""
+Benchmark: the cost another worker's write puts on this worker's next request.
+
+Two AgentService instances share one store directory, as two uvicorn workers would.
+Worker A has its search index warm; worker B then flushes usage increments (what
+USAGE_FLUSH_INTERVAL does every few seconds) or edits one agent's description.
+Reported: A's first search after each write, against a warm search with no write.
+
+Usage (from backend/):  python test/bench_agent_reload.py [catalog size] [json|sqlite]   (default: 20000 json)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.custom_agent import AgentUpdateRequest, CustomAgent  # noqa: E402
+from services.agent_service import AgentService  # noqa: E402
+
+WORDS = ("duty fairness outcome harm honesty virtue courage rule promise consent care justice "
+         "welfare character wisdom pragmatic mediator compromise rights utility").split()
+
+
+def make_catalog(n: int):
+    rng = random.Random(7)
+    agents = {}
+    for i in range(n):
+        description = " ".join(rng.choice(WORDS) for _ in range(40))
+        agent = CustomAgent(name=f"Agent {i}", description=description, enhanced_prompt=description,
+                            system_prompt=f"You are Agent {i}. {description}")
+        agents[agent.id] = agent.dict()
+    return agents
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(n: int = 20000, backend: str = "json"):
+    with tempfile.TemporaryDirectory() as tmp:
+        a = AgentService(tmp, backend)
+        a.store.import_records(make_catalog(n), {})
+        b = AgentService(tmp, backend)
+        a.warm_search_index()
+        ids = [agent.id for agent in a.all_custom_agents()]
+
+        def search():
+            a.list_agents(search="fairness mediator", limit=20)
+
+        rows = [("warm search", timed(search))]
+        for agent_id in random.sample(ids, 50):
+            b.increment_usage(agent_id)
+        b.flush_usage()
+        rows.append(("after usage flush", timed(search)))
+        b.update_agent(ids[0], AgentUpdateRequest(description="A zealous pluralist " + "who weighs every view. " * 4))
+        rows.append(("after one edit", timed(search)))
+        rows.append(("warm search", timed(search)))
+        found = any(agent.id == ids[0] for agent in a.list_agents(search="zealous pluralist", limit=5))
+
+    print(f"{n} agents ({backend}), registry loads {a.registry.loads}, syncs {a.registry.syncs}, edit visible: {found}")
+    for name, ms in rows:
+        print(f"{name:<20}{ms:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, sys.argv[2] if len(sys.argv) > 2 else "json")
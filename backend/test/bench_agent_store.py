@@ -0,0 +1,88 @@
+"""
+Benchmark: JSON-file vs SQLite agent storage at growing catalog sizes.
+
+For each size the catalog (plus one rating per ten agents) is bulk-loaded into a fresh
+store of each kind, then the operations AgentService performs are timed against it:
+cold load, create, usage increment, rating insert, ratings lookup and the top-50 listing.
+
+Usage (from backend/):  python test/bench_agent_store.py [sizes...]   (default: 1000 10000 100000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.custom_agent import AgentRating, CustomAgent  # noqa: E402
+from services.agent_store import JsonAgentStore, SqliteAgentStore  # noqa: E402
+
+DESCRIPTION = "A pragmatic mediator who weighs duties against outcomes and looks for compromise."
+
+
+def make_catalog(n: int):
+    agents, ratings = {}, {}
+    for i in range(n):
+        agent = CustomAgent(name=f"Agent {i}", description=DESCRIPTION, enhanced_prompt=DESCRIPTION,
+                            system_prompt=f"You are Agent {i}. {DESCRIPTION}",
+                            usage_count=random.randint(0, 500), average_rating=round(random.uniform(1, 5), 2))
+        agents[agent.id] = agent.dict()
+    ids = list(agents)
+    for agent_id in random.sample(ids, max(1, n // 10)):
+        rating = AgentRating(agent_id=agent_id, debate_id="bench", argument_quality=4, consistency=4,
+                             engagement=3, overall_satisfaction=5)
+        ratings[rating.id] = rating.dict()
+    return agents, ratings
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(store, agents, ratings, repeat: int) -> dict:
+    store.import_records(agents, ratings)
+    ids = list(agents)
+    rated = next(iter(ratings.values()))["agent_id"]
+    results = {"load": timed(store.load_agents, 1)}
+
+    def create():
+        agent = CustomAgent(name="New agent", description=DESCRIPTION, enhanced_prompt="e", system_prompt="s")
+        store.save_agent(agent.dict())
+
+    def rate():
+        rating = AgentRating(agent_id=random.choice(ids), debate_id="bench", argument_quality=5,
+                             consistency=5, engagement=5, overall_satisfaction=5)
+        store.add_rating(rating.dict())
+
+    results["create"] = timed(create, repeat)
+    results["increment_usage"] = timed(lambda: store.update_agent(random.choice(ids), {"usage_count": 1}), repeat)
+    results["add_rating"] = timed(rate, repeat)
+    results["get_ratings"] = timed(lambda: store.get_ratings(rated), repeat)
+    results["list_top_50"] = timed(lambda: store.rank_agents(True, 50), repeat)
+    return results
+
+
+def main(sizes):
+    for n in sizes:
+        agents, ratings = make_catalog(n)
+        repeat = 20 if n <= 10000 else 3
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            json_store = JsonAgentStore(tmp / "custom_agents.json", tmp / "agent_ratings.json")
+            sqlite_store = SqliteAgentStore(tmp / "agents.sqlite3")
+            rows = {"json": bench(json_store, agents, ratings, repeat),
+                    "sqlite": bench(sqlite_store, agents, ratings, repeat)}
+        print(f"\n{n} agents, {len(ratings)} ratings (ms per op)")
+        print(f"{'operation':<18}{'json':>12}{'sqlite':>12}")
+        for op in rows["json"]:
+            print(f"{op:<18}{rows['json'][op]:>12.2f}{rows['sqlite'][op]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark: single-pass clamp_json vs the old regex cascade.
+
+Runs both over a corpus of malformed model outputs of the kinds seen in debates
+(fences, prose around the object, nested judge scores, truncation, raw newlines,
+braces and escaped quotes inside arguments) and reports which outputs each one
+recovers and how long a call takes.
+
+Usage (from backend/):  python test/bench_clamp_json.py [iterations]
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from main import clamp_json  # noqa: E402
+
+
+def legacy_clamp_json(s: str, fallback: dict, required=("stance", "argument")) -> dict:
+    """clamp_json as it was before the single-pass scanner"""
+    try:
+        text = s.strip()
+        fence = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL | re.IGNORECASE)
+        if fence:
+            try:
+                return json.loads(fence.group(1))
+            except json.JSONDecodeError:
+                pass
+        try:
+            j = json.loads(text)
+            if isinstance(j, dict) and all(k in j for k in required):
+                return j
+        except json.JSONDecodeError:
+            pass
+        objs = re.findall(r"\{.*?\}", text, re.DOTALL)
+        best = None
+        for m in objs:
+            try:
+                j = json.loads(m)
+                if isinstance(j, dict):
+                    if "stance" in j and "argument" in j:
+                        return j
+                    if best is None:
+                        best = j
+            except json.JSONDecodeError:
+                continue
+        if best is not None:
+            return best
+        stance_match = re.search(r'"stance"\s*:\s*"([^"]*)"', text, re.IGNORECASE)
+        arg_match = re.search(r'"argument"\s*:\s*"([^"]+)"', text, re.DOTALL | re.IGNORECASE)
+        if stance_match and arg_match:
+            return {"stance": stance_match.group(1).strip().upper(), "argument": arg_match.group(1)}
+        return fallback | {"_debug": text[:500]}
+    except Exception as e:
+        return fallback | {"_debug": f"[clamp_json error] {e}: {s[:200]}"}
+
+
+ARG = ("Conse, your focus on outcomes ignores the duty we owe to the honor code. "
+       "A rule that bends whenever the stakes feel high is no rule at all. ") * 3
+TURN = {"stance": "A", "argument": ARG}
+VERDICT = {
+    "scores": {"Deon": {"clarity": 8, "consistency": 9}, "Conse": {"clarity": 7, "consistency": 6}},
+    "final_recommendation": "A",
+    "confidence": 72,
+    "verdict": "Deon's appeal to fairness outweighs the short-term benefit argued by Conse.",
+}
+TURN_KEYS = ("stance", "argument")
+JUDGE_KEYS = ("final_recommendation", "verdict")
+
+# (name, raw model output, required keys)
+CORPUS = [
+    ("clean", json.dumps(TURN), TURN_KEYS),
+    ("fenced", "```json\n" + json.dumps(TURN, indent=2) + "\n```", TURN_KEYS),
+    ("prose around", "Sure! Here is my answer:\n" + json.dumps(TURN) + "\nI hope this helps.", TURN_KEYS),
+    ("trailing second object", json.dumps(TURN) + '\n{"note": "extra"}', TURN_KEYS),
+    ("braces in argument", json.dumps({"stance": "B", "argument": "Outcomes {not rules} decide. " + ARG}), TURN_KEYS),
+    ("escaped quotes", json.dumps({"stance": "A", "argument": 'As Kant said, "act only by that maxim". ' + ARG}), TURN_KEYS),
+    ("raw newline in string", '{"stance":"A","argument":"First line.\nSecond line. ' + ARG + '"}', TURN_KEYS),
+    ("thinking then answer", "Let me think {the user wants A or B}...\n" + json.dumps(TURN), TURN_KEYS),
+    ("truncated object", '{"stance":"A","argument":"' + ARG[:120] + '", "conf', TURN_KEYS),
+    ("truncated string", '{"stance":"A","argument":"' + ARG[:120], TURN_KEYS),
+    ("judge clean", json.dumps(VERDICT), JUDGE_KEYS),
+    ("judge fenced", "```json\n" + json.dumps(VERDICT, indent=2) + "\n```", JUDGE_KEYS),
+    ("judge with prose", "My verdict follows.\n" + json.dumps(VERDICT) + "\nThanks for reading.", JUDGE_KEYS),
+    ("no json", "I cannot answer in JSON, but I would choose option A because " + ARG, TURN_KEYS),
+    ("stray brace in prose", 'Sure { here is my answer:\n{"stance":"B","argument":"Deon, ' + ARG + '"}', TURN_KEYS),
+    ("echoed template, then fenced", '{"stance":"A|B","argument":"<paragraph>"\n```json\n' + json.dumps(TURN) + "\n```", TURN_KEYS),
+    ("invalid object wrapping answer", '{ answer: ' + json.dumps(TURN) + " }", TURN_KEYS),
+]
+
+
+def recovered(result: dict, required) -> bool:
+    return "_debug" not in result and all(k in result for k in required)
+
+
+def main(iterations: int = 2000):
+    fallback = {"stance": "A", "argument": "—"}
+    print(f"{'case':<34}{'legacy':>10}{'scanner':>10}{'legacy us':>12}{'scanner us':>12}")
+    totals = [0.0, 0.0]
+    wins = [0, 0]
+    for name, raw, required in CORPUS:
+        row = []
+        for i, fn in enumerate((legacy_clamp_json, clamp_json)):
+            ok = recovered(fn(raw, fallback, required), required)
+            secs = timeit.timeit(lambda: fn(raw, fallback, required), number=iterations) / iterations
+            totals[i] += secs
+            wins[i] += ok
+            row += ["ok" if ok else "miss", secs * 1e6]
+        print(f"{name:<34}{row[0]:>10}{row[2]:>10}{row[1]:>12.1f}{row[3]:>12.1f}")
+    print(f"{'total':<34}{wins[0]:>10}{wins[1]:>10}{totals[0] * 1e6:>12.1f}{totals[1] * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,61 @@
+"""
+Benchmark: PromptAnalyzer per-description scoring vs analyze_batch.
+
+Scores a synthetic catalog of agent descriptions both ways, checks that the batch path
+returns exactly the same scores and suggestions, and reports the time per description.
+
+Usage (from backend/):  python test/bench_prompt_analyzer.py [catalog size]   (default: 10000)
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402,F401  (enhancement_service imports from main, so load main first)
+from services.enhancement_service import PromptAnalyzer  # noqa: E402
+
+SENTENCES = [
+    "I believe honesty is the most important value in any decision.",
+    "This agent is compassionate but firm, and it will always choose the option that protects the vulnerable.",
+    "It weighs outcomes carefully because it thinks consequences matter more than rules.",
+    "For instance, it would break a promise to prevent serious harm.",
+    "It is really good at spotting contradictions in arguments.",
+    "Strict about fairness, yet flexible when circumstances change.",
+    "Its reasoning is logical and precise, namely it evaluates each option against specific principles.",
+    "Sometimes it relies on feeling rather than rational analysis.",
+    "Everything depends on the particular situation and the people involved",
+    "A pragmatic mediator who looks for compromise, such as splitting costs between parties.",
+]
+
+
+def make_catalog(n: int):
+    rng = random.Random(42)
+    return [" ".join(rng.sample(SENTENCES, rng.randint(1, 6))) for _ in range(n)]
+
+
+def main(n: int = 10000):
+    analyzer = PromptAnalyzer()
+    catalog = make_catalog(n)
+
+    start = time.perf_counter()
+    single = []
+    for description in catalog:
+        scores = analyzer.analyze_description(description)
+        single.append((scores, analyzer.generate_suggestions(description, scores)))
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = analyzer.analyze_batch(catalog)
+    batch_s = time.perf_counter() - start
+
+    mismatches = sum(a != b for a, b in zip(single, batch))
+    print(f"{n} descriptions, {mismatches} mismatches")
+    print(f"{'per description':<18}{single_s / n * 1e6:>10.1f} us   {single_s * 1000:>8.1f} ms total")
+    print(f"{'analyze_batch':<18}{batch_s / n * 1e6:>10.1f} us   {batch_s * 1000:>8.1f} ms total")
+    print(f"speedup {single_s / batch_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
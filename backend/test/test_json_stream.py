@@ -0,0 +1,93 @@
+"""
+Unit tests for services/json_stream.py and clamp_json (no server or model needed).
+
+Usage (from backend/):  python -m pytest test/test_json_stream.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.json_stream import (  # noqa: E402
+    JsonFieldStream, JsonObjectScanner, JsonObjectTracker, first_object, iter_objects,
+)
+
+TURN = {"stance": "B", "argument": "Deon, rules {even strict ones} bend when \"lives\" are at stake."}
+KEYS = ("stance", "argument")
+
+
+def objects(text, final=True):
+    return [obj for _, obj in iter_objects(JsonObjectScanner(), text, final)]
+
+
+def test_scanner_finds_objects_between_prose():
+    text = "Sure!\n```json\n" + json.dumps(TURN) + '\n```\nAlso {"note": 1}'
+    assert objects(text) == [TURN, {"note": 1}]
+
+
+def test_scanner_keeps_nested_objects_and_braces_in_strings():
+    verdict = {"scores": {"Deon": {"clarity": 8}}, "final_recommendation": "A", "verdict": "{A} wins"}
+    assert objects(json.dumps(verdict)) == [verdict]
+
+
+def test_scanner_token_by_token_matches_whole_text():
+    text = "thinking {aloud}... " + json.dumps(TURN)
+    scanner = JsonObjectScanner()
+    spans = []
+    for i in range(0, len(text), 3):
+        spans += list(scanner.feed(text[i:i + 3]))
+    assert spans == list(JsonObjectScanner().feed(text))
+
+
+def test_resync_after_unmatched_brace_in_prose():
+    text = 'Sure { here is my answer:\n' + json.dumps(TURN)
+    assert first_object(JsonObjectScanner(), text, KEYS) == (TURN, TURN)
+
+
+def test_resync_after_echoed_unclosed_template():
+    text = '{"stance":"A|B","argument":"..."\n```json\n' + json.dumps(TURN) + "\n```"
+    match, _ = first_object(JsonObjectScanner(), text, KEYS)
+    assert match == TURN
+
+
+def test_resync_after_span_that_fails_to_parse():
+    text = "{ answer: " + json.dumps(TURN) + " }"
+    assert objects(text) == [TURN]
+
+
+def test_open_brace_mid_stream_is_not_resynced_until_final():
+    text = "Sure { here: " + json.dumps(TURN)
+    assert objects(text, final=False) == []
+    assert objects(text, final=True) == [TURN]
+
+
+def test_tracker_stops_at_first_object_with_required_keys():
+    tracker = JsonObjectTracker(KEYS)
+    text = '{"note": 1} ' + json.dumps(TURN) + " and then some trailing prose"
+    done_at = next(i for i in range(len(text)) if tracker.feed(text[i]))
+    assert tracker.text[:tracker.end] == text[:text.index(" and then")]
+    assert done_at == tracker.end - 1
+
+
+def test_tracker_resyncs_after_unparseable_span():
+    tracker = JsonObjectTracker(KEYS)
+    assert tracker.feed("{ nope: " + json.dumps(TURN) + " }")
+    assert json.loads(tracker.text[tracker.end - len(json.dumps(TURN)):tracker.end]) == TURN
+
+
+def test_field_stream_decodes_argument_incrementally():
+    raw = json.dumps({"stance": "A", "argument": "Café \"quoted\"\nnext \U0001F600"})
+    stream = JsonFieldStream("argument")
+    out = "".join(stream.feed(raw[i:i + 2]) for i in range(0, len(raw), 2))
+    assert out == "Café \"quoted\"\nnext \U0001F600"
+    assert stream.complete
+
+
+def test_clamp_json_recovers_turn_after_stray_brace():
+    import main  # noqa: F401  (loads the app; no model calls are made)
+    fallback = {"stance": "A", "argument": "—"}
+    raw = 'Sure { here is my answer:\n{"stance":"B","argument":"Deon, duty binds us."}'
+    assert main.clamp_json(raw, fallback) == {"stance": "B", "argument": "Deon, duty binds us."}
+    raw = '{"stance":"A|B","argument":"..."\n```json\n{"stance":"B","argument":"Deon, no."}\n```'
+    assert main.clamp_json(raw, fallback) == {"stance": "B", "argument": "Deon, no."}